@@ -0,0 +1,7 @@
+import os
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+# Serve the async variants of the hot views (see manage/async_views.py)
+os.environ.setdefault('ASYNC_VIEWS', 'True')
+application = get_asgi_application()
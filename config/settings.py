@@ -59,6 +59,17 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'config.wsgi.application'
+ASGI_APPLICATION = 'config.asgi.application'
+
+# Async views (enabled by config/asgi.py). Blocking work is pushed onto bounded
+# pools; once a pool's backlog is full, requests get a 503 instead of queueing.
+ASYNC_VIEWS = config('ASYNC_VIEWS', default=False, cast=bool)
+ASYNC_DB_WORKERS = config('ASYNC_DB_WORKERS', default=8, cast=int)
+ASYNC_IO_WORKERS = config('ASYNC_IO_WORKERS', default=8, cast=int)
+ASYNC_MAX_PENDING = config('ASYNC_MAX_PENDING', default=256, cast=int)
+# PDF slips are CPU-bound; 0 renders them on threads instead of processes.
+PDF_WORKER_PROCESSES = config('PDF_WORKER_PROCESSES', default=0 if IS_VERCEL else 2, cast=int)
+PDF_MAX_PENDING = config('PDF_MAX_PENDING', default=512, cast=int)
 
 DATABASES = {}
 
@@ -78,6 +89,15 @@ else:
 
 AUTH_PASSWORD_VALIDATORS = []
 
+# Password hashing. Changing the iteration count rehashes each user on their
+# next successful login; `manage.py benchmark hashers` shows the login cost.
+PASSWORD_HASH_ITERATIONS = config('PASSWORD_HASH_ITERATIONS', default=600000, cast=int)
+PASSWORD_HASHERS = [
+    'manage.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+
 LANGUAGE_CODE = 'en-us'
 TIME_ZONE = 'UTC'
 USE_I18N = True
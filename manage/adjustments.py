@@ -0,0 +1,190 @@
+"""Bulk payroll adjustments, computed column by column in integer cents.
+
+The records for one month are pulled out of the user list into ``array('q')``
+columns (one per money field) alongside the user attributes rules filter on.
+Each rule is then one pass over whole columns: build a selection mask,
+compute the new column, swap it in. Records are only touched by
+``write_back`` once every rule has run, so a dry run previews exactly what a
+commit would write.
+
+Rules are dicts::
+
+    {'op': 'percent', 'field': 'base_salary', 'value': 5, 'where': {'department': 'Sales'}}
+    {'op': 'set', 'field': 'allowances', 'value': 750000, 'where': {'position': 'Lead'}}
+    {'op': 'add', 'field': 'deductions', 'value': -50000, 'where': {'id': [3, 7]}}
+    {'op': 'recompute_net', 'where': {}}
+
+``where`` matches user fields by equality (a list matches any of its values).
+``net_salary`` is derived: every row a rule selects gets it recomputed.
+"""
+from array import array
+from decimal import Decimal, InvalidOperation
+
+from manage import payroll
+
+OPS = ('percent', 'add', 'set', 'recompute_net')
+INPUT_FIELDS = ('base_salary', 'allowances', 'deductions')
+FILTER_FIELDS = ('id', 'username', 'department', 'position', 'role', 'is_active')
+
+# Percentages are applied as integer parts per million of the amount
+_PPM = 1_000_000
+
+
+def _round_div(numerator, denominator):
+    """Integer division rounded half away from zero"""
+    quotient, remainder = divmod(abs(numerator), denominator)
+    if remainder * 2 >= denominator:
+        quotient += 1
+    return quotient if numerator >= 0 else -quotient
+
+
+def parse_rules(rules):
+    """Validate rules; returns (rules, error)"""
+    if not isinstance(rules, list) or not rules:
+        return None, 'At least one rule is required'
+
+    parsed = []
+    for number, rule in enumerate(rules, 1):
+        if not isinstance(rule, dict):
+            return None, f'Rule {number} must be an object'
+        op = rule.get('op')
+        if op not in OPS:
+            return None, f"Rule {number}: op must be one of {', '.join(OPS)}"
+
+        where = rule.get('where') or {}
+        if not isinstance(where, dict):
+            return None, f'Rule {number}: where must be an object'
+        unknown = set(where) - set(FILTER_FIELDS)
+        if unknown:
+            return None, f"Rule {number}: cannot filter on {', '.join(sorted(unknown))}"
+        for field, value in where.items():
+            values = value if isinstance(value, list) else [value]
+            if not all(isinstance(v, (str, int, float, bool, type(None))) for v in values):
+                return None, f'Rule {number}: where.{field} must be a value or a list of values'
+        where = {field: set(value) if isinstance(value, list) else {value} for field, value in where.items()}
+
+        if op == 'recompute_net':
+            parsed.append({'op': op, 'where': where})
+            continue
+
+        field = rule.get('field')
+        if field not in INPUT_FIELDS:
+            return None, f"Rule {number}: field must be one of {', '.join(INPUT_FIELDS)}"
+        try:
+            value = Decimal(str(rule.get('value')))
+        except InvalidOperation:
+            return None, f'Rule {number}: value must be a number'
+        if not value.is_finite():
+            return None, f'Rule {number}: value must be a number'
+
+        if op == 'percent':
+            if value <= -100:
+                return None, f'Rule {number}: percent must be greater than -100'
+            amount = int((value * _PPM / 100).to_integral_value())
+            if amount > payroll.MAX_MINOR:
+                return None, f'Rule {number}: value out of range'
+        else:
+            if op == 'set' and value < 0:
+                return None, f'Rule {number}: cannot set a negative amount'
+            try:
+                amount = payroll.parse_minor(value)
+            except ValueError:
+                return None, f'Rule {number}: value out of range'
+        parsed.append({'op': op, 'field': field, 'amount': amount, 'where': where})
+    return parsed, None
+
+
+class PayrollColumns:
+    """One month of payroll records for ``users``, as integer-cent columns"""
+
+    def __init__(self, users, month, user_ids=None):
+        self.month = month
+        self.users = []
+        self.records = []
+        for user in users:
+            if user_ids is not None and user['id'] not in user_ids:
+                continue
+            record = payroll.find_record(user.get('payroll_history') or [], month)
+            if record is not None:
+                self.users.append(user)
+                self.records.append(record)
+
+        self.original = {
+            field: array('q', [payroll.to_minor(r.get(field)) for r in self.records])
+            for field in payroll.MONEY_FIELDS
+        }
+        self.columns = {field: array('q', column) for field, column in self.original.items()}
+        self.selected = bytearray(len(self.records))
+
+    def __len__(self):
+        return len(self.records)
+
+    def select(self, where):
+        """Mask of the rows whose user matches every ``where`` clause"""
+        mask = bytearray(b'\x01') * len(self.users)
+        for field, allowed in where.items():
+            mask = bytearray(
+                m and (user.get(field) in allowed)
+                for m, user in zip(mask, self.users)
+            )
+        return mask
+
+    def apply(self, rule):
+        """Apply one parsed rule; returns how many rows it selected"""
+        mask = self.select(rule['where'])
+        op = rule['op']
+        if op != 'recompute_net':
+            column = self.columns[rule['field']]
+            amount = rule['amount']
+            if op == 'set':
+                values = (amount if m else v for v, m in zip(column, mask))
+            elif op == 'add':
+                values = (max(v + amount, 0) if m else v for v, m in zip(column, mask))
+            else:
+                values = (v + _round_div(v * amount, _PPM) if m else v for v, m in zip(column, mask))
+            self.columns[rule['field']] = array('q', values)
+        self.selected = bytearray(s | m for s, m in zip(self.selected, mask))
+        return mask.count(1)
+
+    def recompute_net(self):
+        """Derive net_salary for every selected row"""
+        base, allowances, deductions = (self.columns[f] for f in INPUT_FIELDS)
+        self.columns['net_salary'] = array('q', (
+            payroll.net_minor(b, a, d) if s else n
+            for b, a, d, n, s in zip(base, allowances, deductions, self.columns['net_salary'], self.selected)
+        ))
+
+    def changed_rows(self):
+        """Indexes of rows where any money field differs from the original"""
+        changed = bytearray(len(self.records))
+        for field in payroll.MONEY_FIELDS:
+            changed = bytearray(
+                c | (a != b)
+                for c, a, b in zip(changed, self.original[field], self.columns[field])
+            )
+        return [i for i, c in enumerate(changed) if c]
+
+    def totals(self):
+        return {
+            field: {
+                'before': payroll.from_minor(sum(self.original[field])),
+                'after': payroll.from_minor(sum(self.columns[field])),
+            }
+            for field in payroll.MONEY_FIELDS
+        }
+
+    def diff(self, rows):
+        return [{
+            'user_id': self.users[i]['id'],
+            'username': self.users[i].get('username'),
+            'before': {f: payroll.from_minor(self.original[f][i]) for f in payroll.MONEY_FIELDS},
+            'after': {f: payroll.from_minor(self.columns[f][i]) for f in payroll.MONEY_FIELDS},
+        } for i in rows]
+
+    def write_back(self, rows, updated_at):
+        """Copy the new amounts into the underlying records"""
+        for i in rows:
+            record = self.records[i]
+            for field in payroll.MONEY_FIELDS:
+                record[field] = payroll.from_minor(self.columns[field][i])
+            record['updated_at'] = updated_at
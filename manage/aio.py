@@ -0,0 +1,100 @@
+"""Async facade over the blocking storage layer.
+
+Everything here ends up on a bounded executor: the JSON database and file I/O
+on thread pools, PDF rendering on a process pool. Each pool admits a fixed
+backlog; past that, ``run`` raises ``PoolSaturated`` straight away so a burst
+of slow requests cannot queue up in front of fast ones.
+"""
+import asyncio
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+
+from django.conf import settings
+
+from manage.db import Database
+
+
+class PoolSaturated(Exception):
+    """Raised when a pool's backlog is full"""
+
+
+class BoundedPool:
+    """Lazily started executor that refuses work beyond ``max_pending`` calls"""
+
+    def __init__(self, name, max_workers, max_pending, processes=False):
+        self.name = name
+        self.max_workers = max_workers
+        self.processes = processes
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def _get_executor(self):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    if self.processes:
+                        # spawn: forking a process that runs an event loop and
+                        # worker threads is not safe
+                        self._executor = ProcessPoolExecutor(
+                            max_workers=self.max_workers,
+                            mp_context=multiprocessing.get_context('spawn'),
+                        )
+                    else:
+                        self._executor = ThreadPoolExecutor(
+                            max_workers=self.max_workers,
+                            thread_name_prefix=f'umd-{self.name}',
+                        )
+        return self._executor
+
+    async def run(self, fn, *args, **kwargs):
+        """Run ``fn`` on the pool and await its result"""
+        if not self._slots.acquire(blocking=False):
+            raise PoolSaturated(self.name)
+        try:
+            future = self._get_executor().submit(partial(fn, *args, **kwargs))
+        except BaseException:
+            self._slots.release()
+            raise
+        # Released when the work finishes, not when the caller stops waiting,
+        # so a disconnected client still counts until its job is done.
+        future.add_done_callback(lambda _: self._slots.release())
+        return await asyncio.wrap_future(future)
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+db_pool = BoundedPool('db', settings.ASYNC_DB_WORKERS, settings.ASYNC_MAX_PENDING)
+io_pool = BoundedPool('io', settings.ASYNC_IO_WORKERS, settings.ASYNC_MAX_PENDING)
+pdf_pool = BoundedPool(
+    'pdf',
+    settings.PDF_WORKER_PROCESSES or settings.ASYNC_IO_WORKERS,
+    settings.PDF_MAX_PENDING,
+    processes=settings.PDF_WORKER_PROCESSES > 0,
+)
+
+
+class _AsyncDatabase:
+    """Awaitable mirror of ``Database``: ``await AsyncDatabase.get_user_by_id(1)``"""
+
+    def __getattr__(self, name):
+        method = getattr(Database, name)
+        if name.startswith('_') or not callable(method):
+            raise AttributeError(name)
+
+        async def call(*args, **kwargs):
+            return await db_pool.run(method, *args, **kwargs)
+
+        call.__name__ = name
+        call.__doc__ = method.__doc__
+        setattr(self, name, call)
+        return call
+
+
+AsyncDatabase = _AsyncDatabase()
@@ -0,0 +1,276 @@
+"""Async variants of the hot views, served when ``settings.ASYNC_VIEWS`` is on.
+
+Same URLs, payloads and status codes as ``manage.views``; the difference is
+that database access, mail, uploads and PDF rendering are awaited on bounded
+pools (``manage.aio``) so one ASGI worker can hold many slow requests open.
+"""
+import asyncio
+import json
+import time
+from functools import wraps
+
+from django.http import HttpResponse, HttpResponseNotAllowed, JsonResponse
+
+from manage.aio import AsyncDatabase, PoolSaturated, io_pool, pdf_pool
+from manage.payslip import build_payslip_pdf
+from manage.views import (
+    CHANGE_HEARTBEAT_SECONDS,
+    CHANGE_POLL_INTERVAL,
+    CHANGE_STREAM_SECONDS,
+    _change_feed_params,
+    _event_stream_response,
+    _payroll_query,
+    _profile_picture_error,
+    _sanitize_user,
+    _save_profile_picture,
+    _send_verification_email,
+    _sse_message,
+    _users_page,
+    _users_page_query,
+)
+
+
+def _async_view(methods, csrf_exempt=False):
+    """``require_http_methods``/``csrf_exempt`` for async views, plus 503 on saturation"""
+    def decorator(func):
+        @wraps(func)
+        async def view(request, *args, **kwargs):
+            if request.method not in methods:
+                return HttpResponseNotAllowed(methods)
+            try:
+                return await func(request, *args, **kwargs)
+            except PoolSaturated:
+                response = JsonResponse({'error': 'Server busy, please retry'}, status=503)
+                response['Retry-After'] = '1'
+                return response
+        if csrf_exempt:
+            view.csrf_exempt = True
+        return view
+    return decorator
+
+
+async def _payroll_page_response(user_id, query):
+    page, error = await AsyncDatabase.get_payroll_page(user_id, **query)
+    if error:
+        return JsonResponse({'error': error}, status=404)
+    return JsonResponse({
+        'payroll_history': page['records'],
+        'next_cursor': page['next_cursor'],
+        'payroll_ytd': page['ytd'],
+    })
+
+
+async def _session_user(request):
+    if 'user_id' not in request.session:
+        return None
+    return await AsyncDatabase.get_user_by_id(request.session['user_id'])
+
+
+# API: Get payroll history for current user
+@_async_view(['GET'])
+async def api_payroll_me(request):
+    user = await _session_user(request)
+    if not user:
+        return JsonResponse({'error': 'Unauthorized'}, status=401)
+
+    query, error = _payroll_query(request)
+    if error:
+        return JsonResponse({'error': error}, status=400)
+
+    return await _payroll_page_response(user['id'], query)
+
+# API: Get payroll history for user (Admin only)
+@_async_view(['GET'])
+async def api_payroll_user_history(request, user_id):
+    if 'user_id' not in request.session:
+        return JsonResponse({'error': 'Unauthorized'}, status=401)
+
+    admin_user = await _session_user(request)
+    if not admin_user or admin_user['role'] != 'admin':
+        return JsonResponse({'error': 'Forbidden'}, status=403)
+
+    query, error = _payroll_query(request)
+    if error:
+        return JsonResponse({'error': error}, status=400)
+
+    return await _payroll_page_response(user_id, query)
+
+# API: Generate payroll PDF (user or admin)
+@_async_view(['GET'])
+async def api_payroll_pdf(request, user_id):
+    requester = await _session_user(request)
+    if not requester:
+        return JsonResponse({'error': 'Unauthorized'}, status=401)
+
+    if requester['role'] != 'admin' and requester['id'] != user_id:
+        return JsonResponse({'error': 'Forbidden'}, status=403)
+
+    month = request.GET.get('month')
+    if not month:
+        return JsonResponse({'error': 'Month is required (YYYY-MM)'}, status=400)
+
+    user = requester if requester['id'] == user_id else await AsyncDatabase.get_user_by_id(user_id)
+    if not user:
+        return JsonResponse({'error': 'User not found'}, status=404)
+
+    record, error = await AsyncDatabase.get_payroll_record(user_id, month)
+    if error:
+        return JsonResponse({'error': error}, status=404)
+    if not record:
+        return JsonResponse({'error': 'Payroll record not found'}, status=404)
+
+    pdf = await pdf_pool.run(build_payslip_pdf, user, record, month)
+
+    filename = f"slip-gaji-{user.get('username')}-{month}.pdf"
+    response = HttpResponse(pdf, content_type='application/pdf')
+    response['Content-Disposition'] = f'inline; filename="{filename}"'
+    return response
+
+# API: Get all users (Admin only)
+@_async_view(['GET'])
+async def api_users(request):
+    if 'user_id' not in request.session:
+        return JsonResponse({'error': 'Unauthorized'}, status=401)
+
+    user = await _session_user(request)
+    if not user or user['role'] != 'admin':
+        return JsonResponse({'error': 'Forbidden'}, status=403)
+
+    query, error = _users_page_query(request)
+    if error:
+        return JsonResponse({'error': error}, status=400)
+
+    last_seq = await AsyncDatabase.get_change_seq()
+    if query:
+        page, page_size = query['page'], query['page_size']
+        users, total = await AsyncDatabase.get_users_page((page - 1) * page_size, page_size)
+        return JsonResponse(_users_page(page, page_size, last_seq, users, total))
+
+    users = await AsyncDatabase.get_all_users()
+    return JsonResponse({'users': [_sanitize_user(u) for u in users], 'last_seq': last_seq})
+
+async def _change_stream(since):
+    yield 'retry: 2000\n\n'
+    deadline = time.monotonic() + CHANGE_STREAM_SECONDS
+    quiet_since = time.monotonic()
+    while time.monotonic() < deadline:
+        try:
+            changes, last_seq, reset = await AsyncDatabase.get_changes(since)
+        except PoolSaturated:
+            changes, reset = [], False
+        if reset:
+            yield _sse_message('reset', {'last_seq': last_seq})
+            return
+        for change in changes:
+            yield _sse_message('change', change, change['seq'])
+            since = change['seq']
+        if changes:
+            quiet_since = time.monotonic()
+        elif time.monotonic() - quiet_since >= CHANGE_HEARTBEAT_SECONDS:
+            yield ': ping\n\n'
+            quiet_since = time.monotonic()
+        await asyncio.sleep(CHANGE_POLL_INTERVAL)
+
+# API: Change feed (Admin only)
+@_async_view(['GET'])
+async def api_changes(request):
+    if 'user_id' not in request.session:
+        return JsonResponse({'error': 'Unauthorized'}, status=401)
+
+    user = await _session_user(request)
+    if not user or user['role'] != 'admin':
+        return JsonResponse({'error': 'Forbidden'}, status=403)
+
+    params, error = _change_feed_params(request)
+    if error:
+        return JsonResponse({'error': error}, status=400)
+
+    since = params['since']
+    if since is None:
+        since = await AsyncDatabase.get_change_seq()
+
+    if params['stream']:
+        return _event_stream_response(_change_stream(since))
+
+    deadline = time.monotonic() + params['wait']
+    while True:
+        changes, last_seq, reset = await AsyncDatabase.get_changes(since)
+        if changes or reset or time.monotonic() >= deadline:
+            break
+        await asyncio.sleep(CHANGE_POLL_INTERVAL)
+
+    return JsonResponse({'changes': changes, 'last_seq': last_seq, 'reset': reset})
+
+# API: Create user
+@_async_view(['POST'], csrf_exempt=True)
+async def api_create_user(request):
+    if 'user_id' not in request.session:
+        return JsonResponse({'error': 'Unauthorized'}, status=401)
+
+    user = await _session_user(request)
+    if not user or user['role'] != 'admin':
+        return JsonResponse({'error': 'Forbidden'}, status=403)
+
+    try:
+        data = json.loads(request.body)
+        new_user, error = await AsyncDatabase.create_user(
+            username=data.get('username'),
+            email=data.get('email'),
+            password=data.get('password'),
+            full_name=data.get('full_name'),
+            role=data.get('role', 'user'),
+            department=data.get('department'),
+            position=data.get('position'),
+            phone=data.get('phone'),
+            emergency_contact_name=data.get('emergency_contact_name'),
+            emergency_contact_phone=data.get('emergency_contact_phone')
+        )
+
+        if error:
+            return JsonResponse({'success': False, 'error': error}, status=400)
+
+        email_error = None
+        try:
+            await io_pool.run(_send_verification_email, new_user, request)
+        except PoolSaturated:
+            raise
+        except Exception as e:
+            email_error = str(e)
+
+        return JsonResponse({'success': True, 'user': _sanitize_user(new_user), 'email_error': email_error})
+    except PoolSaturated:
+        raise
+    except Exception as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+
+def _store_upload(request, user_id):
+    """Parse the multipart body and save the picture; returns (url, error)"""
+    if 'profile_picture' not in request.FILES:
+        return None, 'No file provided'
+
+    file = request.FILES['profile_picture']
+    error = _profile_picture_error(file)
+    if error:
+        return None, error
+    return _save_profile_picture(user_id, file), None
+
+# Upload Profile Picture
+@_async_view(['POST'], csrf_exempt=True)
+async def upload_profile_picture(request, user_id):
+    if 'user_id' not in request.session:
+        return JsonResponse({'error': 'Unauthorized'}, status=401)
+
+    user = await _session_user(request)
+    if not user or (user['id'] != user_id and user['role'] != 'admin'):
+        return JsonResponse({'error': 'Forbidden'}, status=403)
+
+    try:
+        pic_url, error = await io_pool.run(_store_upload, request, user_id)
+        if error:
+            return JsonResponse({'error': error}, status=400)
+
+        return JsonResponse({'success': True, 'profile_picture': pic_url})
+    except PoolSaturated:
+        raise
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=400)
@@ -0,0 +1,92 @@
+"""Append-only, monotonically numbered log of database changes.
+
+Every ``Database`` mutation appends one JSON line (``users.json.changes``)
+while holding the write lock, so sequence numbers are gap-free and ordered
+across threads and processes. Only the newest ``keep`` entries are retained;
+a reader asking for anything older is told to ``reset`` (refetch everything).
+"""
+import json
+import os
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+
+
+def changes_path(db_path: Path) -> Path:
+    return db_path.with_name(db_path.name + '.changes')
+
+
+class ChangeLog:
+    """Reader/writer for the change log next to ``get_db_path()``"""
+
+    def __init__(self, get_db_path, keep=1000):
+        self._get_db_path = get_db_path
+        self.keep = keep
+        self._lock = threading.Lock()
+        # (path, inode, bytes parsed so far, parsed entries)
+        self._cache = (None, None, 0, [])
+
+    def _entries(self):
+        """All retained entries, parsing only what was appended since last call"""
+        path = changes_path(self._get_db_path())
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return []
+
+        with self._lock:
+            cached_path, inode, parsed, entries = self._cache
+            if cached_path != path or inode != st.st_ino or st.st_size < parsed:
+                parsed, entries = 0, []
+            if st.st_size > parsed:
+                with open(path, 'rb') as f:
+                    f.seek(parsed)
+                    chunk = f.read(st.st_size - parsed)
+                # A writer may be mid-line; leave the partial tail for next time
+                complete = chunk[:chunk.rfind(b'\n') + 1]
+                entries = entries + [json.loads(line) for line in complete.splitlines() if line]
+                parsed += len(complete)
+                if len(entries) > self.keep * 2:
+                    entries = entries[-self.keep:]
+                self._cache = (path, st.st_ino, parsed, entries)
+            return entries
+
+    def last_seq(self):
+        entries = self._entries()
+        return entries[-1]['seq'] if entries else 0
+
+    def since(self, seq):
+        """Return ``(changes, last_seq, reset)`` for everything after ``seq``"""
+        entries = self._entries()
+        last = entries[-1]['seq'] if entries else 0
+        if seq >= last:
+            return [], last, seq > last
+        first = entries[0]['seq']
+        if seq < first - 1:
+            return [], last, True
+        # seqs are contiguous, so the offset is arithmetic
+        return entries[seq - first + 1:], last, False
+
+    def append(self, op, **payload):
+        """Record one change; callers must hold the database write lock"""
+        path = changes_path(self._get_db_path())
+        entries = self._entries()
+        entry = {
+            'seq': (entries[-1]['seq'] if entries else 0) + 1,
+            'at': datetime.now(timezone.utc).isoformat(),
+            'op': op,
+            **payload,
+        }
+        with open(path, 'ab') as f:
+            f.write(json.dumps(entry, separators=(',', ':')).encode('utf-8') + b'\n')
+
+        if len(entries) + 1 > self.keep * 2:
+            self._compact(path, entries[-(self.keep - 1):] + [entry])
+        return entry
+
+    def _compact(self, path, entries):
+        tmp_path = path.with_name(path.name + '.tmp')
+        with open(tmp_path, 'wb') as f:
+            for entry in entries:
+                f.write(json.dumps(entry, separators=(',', ':')).encode('utf-8') + b'\n')
+        os.replace(tmp_path, path)
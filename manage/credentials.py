@@ -0,0 +1,141 @@
+"""Credential index and password checks for the login path.
+
+``authenticate`` only needs a user's id, password hash and active/verified
+flags, so those are kept in memory keyed by username instead of being read
+out of users.json per attempt. ``Database.save`` rebuilds the index after
+every write; another process's write is noticed through the file signature
+and triggers one reload, which concurrent logins wait for and share.
+
+Passwords are stored as Django password hashes. Records written before that
+hold the plaintext, which still verifies once and is then replaced by a hash
+(as are hashes made with an outdated hasher or cost). Every attempt pays for
+exactly one hash verification, so unknown usernames, legacy records and wrong
+passwords all take the same time.
+"""
+import os
+import threading
+from pathlib import Path
+from typing import NamedTuple
+
+from django.contrib.auth.hashers import (
+    check_password,
+    get_hasher,
+    identify_hasher,
+    is_password_usable,
+    make_password,
+)
+from django.utils.crypto import constant_time_compare, get_random_string
+
+
+class Credential(NamedTuple):
+    id: int
+    password: str
+    is_active: bool
+    email_verified: bool
+
+
+def hash_password(password):
+    return make_password(password)
+
+
+def is_hashed(value):
+    try:
+        identify_hasher(value)
+    except ValueError:
+        return False
+    return True
+
+
+_dummy_lock = threading.Lock()
+_dummy = (None, None)
+
+
+def _dummy_hash():
+    """A hash of a random password made with the current hasher settings"""
+    global _dummy
+    hasher = get_hasher()
+    key = (hasher.algorithm, getattr(hasher, 'iterations', None))
+    with _dummy_lock:
+        if _dummy[0] != key:
+            _dummy = (key, make_password(get_random_string(32)))
+        return _dummy[1]
+
+
+def verify_password(password, stored):
+    """Check ``password`` against a stored hash or legacy plaintext.
+
+    Returns ``(ok, needs_rehash)``. ``stored`` is None for unknown users.
+    """
+    password = password or ''
+    if stored and is_hashed(stored):
+        rehash = []
+        ok = check_password(password, stored, setter=rehash.append)
+        return ok, bool(rehash)
+
+    # Spend the time a real check would take before answering
+    check_password(password, _dummy_hash())
+    if stored and is_password_usable(stored):
+        ok = constant_time_compare(password, stored)
+        return ok, ok
+    return False, False
+
+
+def _signature(path: Path):
+    st = os.stat(path)
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+class CredentialIndex:
+    """username -> ``Credential`` for every user in ``get_db_path()``"""
+
+    def __init__(self, get_db_path, load_users):
+        self._get_db_path = get_db_path
+        self._load_users = load_users
+        self._lock = threading.Lock()
+        # Held while reloading users.json, so concurrent lookups share one reload
+        self._reload_lock = threading.Lock()
+        # (db path, source signature, entries)
+        self._state = (None, None, {})
+
+    @staticmethod
+    def entries(users):
+        """The index for ``users``, ready to hand to ``rebuild``"""
+        return {
+            user['username']: Credential(
+                user['id'],
+                user.get('password'),
+                bool(user.get('is_active')),
+                user.get('email_verified', True) is not False,
+            )
+            for user in users
+        }
+
+    @staticmethod
+    def load_entries(data):
+        """Entries from their JSON form (``{username: [id, password, is_active, email_verified]}``)"""
+        return {username: Credential(*fields) for username, fields in data.items()}
+
+    def rebuild(self, users=None, entries=None):
+        """Reindex ``users`` (or users.json); call right after writing the file"""
+        db_path = self._get_db_path()
+        signature = _signature(db_path)
+        if entries is None:
+            entries = self.entries(self._load_users() if users is None else users)
+        with self._lock:
+            self._state = (db_path, signature, entries)
+
+    def current(self):
+        """The entries for users.json as it is now"""
+        db_path = self._get_db_path()
+        path, signature, entries = self._state
+        if path != db_path or signature != _signature(db_path):
+            with self._reload_lock:
+                # Whoever held the lock before us may have reloaded already
+                path, signature, entries = self._state
+                if path != db_path or signature != _signature(db_path):
+                    self.rebuild()
+                    entries = self._state[2]
+        return entries
+
+    def get(self, username):
+        return self.current().get(username)
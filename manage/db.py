@@ -1,8 +1,22 @@
 import json
 import os
-from datetime import datetime
+import threading
+import zlib
+from contextlib import contextmanager
+from datetime import datetime, timezone
 from pathlib import Path
 
+try:
+    import fcntl
+except ImportError:  # Windows: only threads within one process are serialized
+    fcntl = None
+
+from manage import adjustments, credentials, payroll, serializers
+from manage.changelog import ChangeLog
+from manage.credentials import CredentialIndex
+from manage.record_store import RecordStore, records_path, retarget, write_users_document
+from manage.snapshots import SnapshotStore
+
 # Path to the users database
 SEED_DB_PATH = Path(__file__).parent / 'data' / 'users.json'
 
@@ -23,6 +37,15 @@ def _get_db_path() -> Path:
 
 DB_PATH = _get_db_path()
 
+# How users.json is encoded; every codec reads files written by any other
+CODEC = serializers.get_codec(os.environ.get('UMD_DB_CODEC', 'auto'))
+
+# How many snapshots of users.json to retain
+SNAPSHOT_KEEP = int(os.environ.get('UMD_SNAPSHOT_KEEP', '10'))
+
+# Never leave the server (API responses, change feed)
+PRIVATE_FIELDS = ('password', 'verification_token', 'verification_sent_at', 'verification_expires_at')
+
 def _ensure_db_exists() -> None:
     if DB_PATH.exists():
         return
@@ -36,6 +59,87 @@ def _ensure_db_exists() -> None:
     else:
         DB_PATH.write_text(json.dumps({'users': []}, indent=2), encoding='utf-8')
 
+def _replace_file(path: Path, write) -> None:
+    """Write ``path`` through ``write(f)`` into a temp file, then swap it in atomically"""
+    # Readers either see the old file or the new one, never a half-written one
+    tmp_path = path.with_name(f'{path.name}.{os.getpid()}.{threading.get_ident()}.tmp')
+    try:
+        with open(tmp_path, 'wb') as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+def _parse_timestamp(value):
+    try:
+        parsed = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+_write_guard = threading.RLock()
+_write_depth = 0
+
+@contextmanager
+def _write_lock():
+    """Serialize load/modify/save cycles across threads and processes"""
+    global _write_depth
+    with _write_guard:
+        if _write_depth:
+            # Re-entered from a method already holding the lock
+            _write_depth += 1
+            try:
+                yield
+            finally:
+                _write_depth -= 1
+            return
+
+        _ensure_db_exists()
+        with open(DB_PATH.with_name(DB_PATH.name + '.lock'), 'a') as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            _write_depth = 1
+            try:
+                yield
+            finally:
+                _write_depth = 0
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+@contextmanager
+def _try_write_lock():
+    """Like ``_write_lock``, but yields False instead of waiting for a write in progress"""
+    global _write_depth
+    if not _write_guard.acquire(blocking=False):
+        yield False
+        return
+    try:
+        if _write_depth:
+            # This thread already holds the lock
+            yield True
+            return
+
+        _ensure_db_exists()
+        with open(DB_PATH.with_name(DB_PATH.name + '.lock'), 'a') as lock_file:
+            if fcntl:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    yield False
+                    return
+            _write_depth = 1
+            try:
+                yield True
+            finally:
+                _write_depth = 0
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+    finally:
+        _write_guard.release()
+
 class Database:
     """Local JSON database handler"""
 
@@ -63,23 +167,87 @@ class Database:
             user['emergency_contact_phone'] = ''
         if 'payroll_history' not in user:
             user['payroll_history'] = []
+        if 'payroll_ytd' not in user:
+            # Older records were kept in insertion order
+            payroll.sort_history(user['payroll_history'])
+            user['payroll_ytd'] = payroll.all_year_totals(user['payroll_history'])
     
     @staticmethod
     def load():
         """Load all users from JSON file"""
         _ensure_db_exists()
         if DB_PATH.exists():
-            with open(DB_PATH, 'r') as f:
-                return json.load(f)
+            with open(DB_PATH, 'rb') as f:
+                return CODEC.load(f)
         return {'users': []}
     
     @staticmethod
     def save(data):
         """Save data to JSON file"""
         _ensure_db_exists()
-        with open(DB_PATH, 'w') as f:
-            json.dump(data, f, indent=2)
+        _replace_file(DB_PATH, lambda f: CODEC.dump(data, f))
+        Database._sync_records(data.get('users', []))
+
+    @staticmethod
+    def _sync_records(users):
+        """Refresh the mmap record store and the credential index after a write"""
+        normalized = []
+        for user in users:
+            user = dict(user)
+            Database._normalize_user(user)
+            normalized.append(user)
+        _credentials.rebuild(normalized)
+        try:
+            _record_store.rebuild(normalized)
+        except (OSError, ValueError):
+            # Readers notice the stale sidecar and rebuild it themselves
+            pass
+
+    @staticmethod
+    def _record_change(op, user, **extra):
+        """Append a change carrying the user's public fields to the change log"""
+        public = {k: v for k, v in user.items() if k not in PRIVATE_FIELDS}
+        Database._normalize_user(public)
+        return _changes.append(op, user_id=user['id'], user=public, **extra)
+
+    @staticmethod
+    def get_change_seq():
+        """Get the sequence number of the latest change (the dataset version)"""
+        return _changes.last_seq()
+
+    @staticmethod
+    def get_changes(since):
+        """Get changes after ``since`` as (changes, last_seq, reset)"""
+        return _changes.since(since)
+
+    @staticmethod
+    def _find_user(key, value):
+        """Get a single user through the record store, scanning as a fallback"""
+        try:
+            return getattr(_record_store, f'get_by_{key}')(value)
+        except (OSError, ValueError):
+            users = Database.get_all_users()
+            return next((u for u in users if u[key] == value), None)
     
+    @staticmethod
+    def get_dataset_version():
+        """Get a cache key that changes on every write to the database"""
+        try:
+            mtime = os.stat(DB_PATH).st_mtime_ns
+        except FileNotFoundError:
+            mtime = 0
+        # The seq covers logged writes; the mtime catches files replaced out of band
+        return f'{_changes.last_seq()}-{mtime}'
+
+    @staticmethod
+    def get_users_page(offset, limit):
+        """Get (users, total) for one slice of the user list"""
+        try:
+            return _record_store.page(offset, limit)
+        except (OSError, ValueError):
+            users = Database.get_all_users()
+            return users[offset:offset + limit], len(users)
+
     @staticmethod
     def get_all_users():
         """Get all users"""
@@ -95,20 +263,17 @@ class Database:
     @staticmethod
     def get_user_by_id(user_id):
         """Get user by ID"""
-        users = Database.get_all_users()
-        return next((u for u in users if u['id'] == user_id), None)
+        return Database._find_user('id', user_id)
     
     @staticmethod
     def get_user_by_username(username):
         """Get user by username"""
-        users = Database.get_all_users()
-        return next((u for u in users if u['username'] == username), None)
+        return Database._find_user('username', username)
     
     @staticmethod
     def get_user_by_email(email):
         """Get user by email"""
-        users = Database.get_all_users()
-        return next((u for u in users if u['email'] == email), None)
+        return Database._find_user('email', email)
 
     @staticmethod
     def get_user_by_verification_token(token):
@@ -130,83 +295,116 @@ class Database:
         emergency_contact_phone=None,
     ):
         """Create a new user"""
-        data = Database.load()
-        users = data.get('users', [])
+        # Hashing is deliberately slow; keep it outside the write lock
+        password_hash = credentials.hash_password(password)
+        with _write_lock():
+            data = Database.load()
+            users = data.get('users', [])
         
-        # Check if user exists
-        if Database.get_user_by_username(username):
-            return None, 'Username already exists'
+            # Check if user exists
+            if Database.get_user_by_username(username):
+                return None, 'Username already exists'
         
-        if Database.get_user_by_email(email):
-            return None, 'Email already exists'
+            if Database.get_user_by_email(email):
+                return None, 'Email already exists'
         
-        new_user = {
-            'id': max([u['id'] for u in users], default=0) + 1,
-            'username': username,
-            'email': email,
-            'password': password,
-            'role': role,
-            'full_name': full_name,
-            'created_at': datetime.now().isoformat(),
-            'is_active': True,
-            'email_verified': False,
-            'verification_token': None,
-            'verification_sent_at': None,
-            'verification_expires_at': None,
-            'profile_picture': None,
-            'department': department or '',
-            'position': position or '',
-            'phone': phone or '',
-            'emergency_contact_name': emergency_contact_name or '',
-            'emergency_contact_phone': emergency_contact_phone or ''
-        }
+            new_user = {
+                'id': max([u['id'] for u in users], default=0) + 1,
+                'username': username,
+                'email': email,
+                'password': password_hash,
+                'role': role,
+                'full_name': full_name,
+                'created_at': datetime.now().isoformat(),
+                'is_active': True,
+                'email_verified': False,
+                'verification_token': None,
+                'verification_sent_at': None,
+                'verification_expires_at': None,
+                'profile_picture': None,
+                'department': department or '',
+                'position': position or '',
+                'phone': phone or '',
+                'emergency_contact_name': emergency_contact_name or '',
+                'emergency_contact_phone': emergency_contact_phone or ''
+            }
         
-        users.append(new_user)
-        data['users'] = users
-        Database.save(data)
-        return new_user, None
+            users.append(new_user)
+            data['users'] = users
+            Database.save(data)
+            Database._record_change('user.created', new_user)
+            return new_user, None
     
     @staticmethod
     def update_user(user_id, **kwargs):
         """Update user information"""
-        data = Database.load()
-        users = data.get('users', [])
+        if kwargs.get('password'):
+            kwargs['password'] = credentials.hash_password(kwargs['password'])
+        else:
+            kwargs.pop('password', None)
+        with _write_lock():
+            data = Database.load()
+            users = data.get('users', [])
         
-        for user in users:
-            if user['id'] == user_id:
-                # Update existing fields or add new fields
-                user.update(kwargs)
-                Database._normalize_user(user)
-                Database.save(data)
-                return user, None
+            for user in users:
+                if user['id'] == user_id:
+                    # Update existing fields or add new fields
+                    user.update(kwargs)
+                    Database._normalize_user(user)
+                    Database.save(data)
+                    Database._record_change('user.updated', user)
+                    return user, None
         
-        return None, 'User not found'
+            return None, 'User not found'
     
     @staticmethod
     def delete_user(user_id):
         """Delete a user"""
-        data = Database.load()
-        users = data.get('users', [])
+        with _write_lock():
+            data = Database.load()
+            users = data.get('users', [])
         
-        original_count = len(users)
-        users = [u for u in users if u['id'] != user_id]
+            original_count = len(users)
+            users = [u for u in users if u['id'] != user_id]
         
-        if len(users) == original_count:
-            return None, 'User not found'
+            if len(users) == original_count:
+                return None, 'User not found'
         
-        data['users'] = users
-        Database.save(data)
-        return True, None
+            data['users'] = users
+            Database.save(data)
+            _changes.append('user.deleted', user_id=user_id)
+            return True, None
     
     @staticmethod
     def authenticate(username, password):
         """Authenticate user"""
-        user = Database.get_user_by_username(username)
-        if user and user['password'] == password and user['is_active']:
-            if user.get('email_verified', True) is False:
-                return None, 'Email not verified. Please check your inbox.'
-            return user, None
-        return None, 'Invalid credentials'
+        # The credential index reads users.json directly; on a cold start it may not exist yet
+        _ensure_db_exists()
+        entry = _credentials.get(username)
+        ok, rehash = credentials.verify_password(password, entry.password if entry else None)
+        if not ok or not entry.is_active:
+            return None, 'Invalid credentials'
+        if not entry.email_verified:
+            return None, 'Email not verified. Please check your inbox.'
+        if rehash:
+            Database._set_password_hash(entry.id, entry.password, credentials.hash_password(password))
+        user = Database.get_user_by_id(entry.id)
+        if not user:
+            return None, 'Invalid credentials'
+        return user, None
+
+    @staticmethod
+    def _set_password_hash(user_id, verified, password_hash):
+        """Replace the stored password ``verified`` with an equivalent hash, unless it has changed since"""
+        with _write_lock():
+            data = Database.load()
+            for user in data.get('users', []):
+                if user['id'] == user_id:
+                    # A password change since the login was verified wins over the rehash
+                    if user.get('password') == verified:
+                        user['password'] = password_hash
+                        Database.save(data)
+                    return
 
     @staticmethod
     def get_payroll_history(user_id):
@@ -217,23 +415,287 @@ class Database:
         history = user.get('payroll_history') or []
         return history, None
 
+    @staticmethod
+    def get_payroll_page(user_id, from_month=None, to_month=None, limit=None, cursor=None, year=None):
+        """Get a month range of payroll history plus one year's running totals"""
+        user = Database.get_user_by_id(user_id)
+        if not user:
+            return None, 'User not found'
+        history = user.get('payroll_history') or []
+        records, next_cursor = payroll.page(history, from_month, to_month, limit, cursor)
+        totals = user['payroll_ytd'].get(str(year)) if year else None
+        return {
+            'records': records,
+            'next_cursor': next_cursor,
+            'ytd': {'year': year, **(totals or payroll.empty_totals())} if year else None,
+        }, None
+
     @staticmethod
     def upsert_payroll_record(user_id, record):
         """Add or update payroll record for a user by month"""
-        data = Database.load()
-        users = data.get('users', [])
+        month = record.get('month')
+        if not payroll.is_valid_month(month):
+            return None, 'Month must be in YYYY-MM format'
 
-        for user in users:
-            if user['id'] == user_id:
+        with _write_lock():
+            data = Database.load()
+            users = data.get('users', [])
+
+            for user in users:
+                if user['id'] == user_id:
+                    Database._normalize_user(user)
+                    history = user['payroll_history']
+                    payroll.upsert_record(history, record)
+                    year = month[:4]
+                    user['payroll_ytd'][year] = payroll.year_totals(history, int(year))
+                    Database.save(data)
+                    Database._record_change('payroll.updated', user, month=month)
+                    return record, None
+
+            return None, 'User not found'
+
+    @staticmethod
+    def open_payroll_month(month, dry_run=False):
+        """Create pending payroll for every active employee, carried over from their last month"""
+        if not payroll.is_valid_month(month):
+            return None, 'Month must be in YYYY-MM format'
+
+        now = datetime.now(timezone.utc).isoformat()
+        created = []
+        skipped_existing = 0
+        skipped_no_history = 0
+
+        with _write_lock():
+            data = Database.load()
+            for user in data.get('users', []):
+                if user.get('role') != 'user' or not user.get('is_active'):
+                    continue
                 Database._normalize_user(user)
-                history = user.get('payroll_history') or []
-                history = [r for r in history if r.get('month') != record.get('month')]
-                history.insert(0, record)
-                user['payroll_history'] = history
+                history = user['payroll_history']
+                if payroll.find_record(history, month):
+                    skipped_existing += 1
+                    continue
+                previous = payroll.latest_before(history, month)
+                if not previous:
+                    skipped_no_history += 1
+                    continue
+
+                # In cents, like every other payroll computation, so no float drift is carried over
+                base_salary = payroll.to_minor(previous.get('base_salary'))
+                allowances = payroll.to_minor(previous.get('allowances'))
+                payroll.upsert_record(history, {
+                    'month': month,
+                    'base_salary': payroll.from_minor(base_salary),
+                    'allowances': payroll.from_minor(allowances),
+                    'deductions': 0.0,
+                    'net_salary': payroll.from_minor(payroll.net_minor(base_salary, allowances, 0)),
+                    'notes': '',
+                    'updated_at': now,
+                    'created_at': now,
+                    'status': 'pending',
+                })
+                user['payroll_ytd'][month[:4]] = payroll.year_totals(history, int(month[:4]))
+                created.append(user['id'])
+
+            if created and not dry_run:
+                # One write and one change entry for the whole batch
+                Database.save(data)
+                _changes.append('payroll.month_opened', month=month, user_ids=created)
+
+        return {
+            'month': month,
+            'dry_run': dry_run,
+            'created': len(created),
+            'skipped_existing': skipped_existing,
+            'skipped_no_history': skipped_no_history,
+            'user_ids': created,
+        }, None
+
+    @staticmethod
+    def adjust_payroll(month, rules, user_ids=None, dry_run=False, expected_seq=None, preview_limit=50):
+        """Apply bulk adjustment rules to one month's payroll in a single write"""
+        if not payroll.is_valid_month(month):
+            return None, 'Month must be in YYYY-MM format'
+        rules, error = adjustments.parse_rules(rules)
+        if error:
+            return None, error
+
+        with _write_lock():
+            # A commit of a previewed diff must not apply on top of newer data
+            if expected_seq is not None and _changes.last_seq() != expected_seq:
+                return None, 'Data changed since the preview; preview again'
+
+            data = Database.load()
+            users = data.get('users', [])
+            for user in users:
+                Database._normalize_user(user)
+
+            try:
+                columns = adjustments.PayrollColumns(users, month, set(user_ids) if user_ids is not None else None)
+                matched = [columns.apply(rule) for rule in rules]
+                columns.recompute_net()
+            except OverflowError:
+                return None, 'Adjusted amounts out of range'
+            changed = columns.changed_rows()
+            changed_ids = [columns.users[i]['id'] for i in changed]
+
+            if changed and not dry_run:
+                columns.write_back(changed, datetime.now(timezone.utc).isoformat())
+                year = month[:4]
+                for i in changed:
+                    user = columns.users[i]
+                    user['payroll_ytd'][year] = payroll.year_totals(user['payroll_history'], int(year))
+                # One write and one change entry for the whole batch
                 Database.save(data)
-                return record, None
+                _changes.append('payroll.adjusted', month=month, user_ids=changed_ids)
+            last_seq = _changes.last_seq()
+
+        return {
+            'month': month,
+            'dry_run': dry_run,
+            'rows': len(columns),
+            'matched': matched,
+            'changed': len(changed),
+            'totals': columns.totals(),
+            'diff': columns.diff(changed[:preview_limit]),
+            'user_ids': changed_ids,
+            'last_seq': last_seq,
+        }, None
+
+    @staticmethod
+    def compact(dry_run=False):
+        """Normalize every user, clear stale verification tokens and rewrite users.json canonically"""
+        now = datetime.now(timezone.utc)
+        with _write_lock():
+            bytes_before = DB_PATH.stat().st_size
+            data = Database.load()
+            users = data.get('users', [])
+
+            tokens_cleared = 0
+            seen = {'id': {}, 'username': {}, 'email': {}}
+            duplicates = {key: [] for key in seen}
+            for user in users:
+                Database._normalize_user(user)
+                payroll.sort_history(user['payroll_history'])
+                user['payroll_ytd'] = payroll.all_year_totals(user['payroll_history'])
+
+                if user.get('verification_token'):
+                    expires_at = _parse_timestamp(user.get('verification_expires_at'))
+                    if user.get('email_verified') or (expires_at and expires_at < now):
+                        user['verification_token'] = None
+                        user['verification_sent_at'] = None
+                        user['verification_expires_at'] = None
+                        tokens_cleared += 1
+
+                for key, values in seen.items():
+                    value = user.get(key)
+                    if value is None or value == '':
+                        continue
+                    if value in values:
+                        duplicates[key].append([values[value], user['id']])
+                    else:
+                        values[value] = user['id']
+
+            users.sort(key=lambda u: u['id'])
+            payload = CODEC.dumps({**data, 'users': users})
+            if not dry_run:
+                _replace_file(DB_PATH, lambda f: f.write(payload))
+                Database._sync_records(users)
+
+        return {
+            'dry_run': dry_run,
+            'users': len(users),
+            'tokens_cleared': tokens_cleared,
+            'duplicates': {key: pairs for key, pairs in duplicates.items() if pairs},
+            'bytes_before': bytes_before,
+            'bytes_after': len(payload),
+            'profile_pictures': sorted(
+                os.path.basename(u['profile_picture']) for u in users if u.get('profile_picture')
+            ),
+        }
+
+    @staticmethod
+    def snapshot(keep=None):
+        """Take a compressed point-in-time snapshot of users.json and return its info"""
+        _ensure_db_exists()
+        with _write_lock():
+            # Only pinning happens under the lock; compression runs after writers resume
+            pending = Database._pin_snapshot()
+        return _snapshots.finish(pending, keep)
+
+    @staticmethod
+    def _pin_snapshot(label=None):
+        """Pin the current record store and credential index; callers hold the write lock"""
+        return _snapshots.pin(
+            _changes.last_seq(),
+            _record_store.fresh_path(),
+            {'credentials': _credentials.current()},
+            label=label,
+        )
 
-        return None, 'User not found'
+    @staticmethod
+    def list_snapshots():
+        """Get info for every retained snapshot, newest first"""
+        return _snapshots.list()
+
+    @staticmethod
+    def restore_snapshot(snapshot_id, backup=True):
+        """Atomically replace users.json with a snapshot; returns (report, error)"""
+        snapshot = _snapshots.get(snapshot_id)
+        if not snapshot:
+            return None, 'Snapshot not found'
+
+        _ensure_db_exists()
+        # Unpack the snapshot's record store and write users.json out of it first; writers
+        # then only wait for the renames, and readers keep being served the current state
+        tmp_path = DB_PATH.with_name(f'{DB_PATH.name}.{os.getpid()}.{threading.get_ident()}.restore.tmp')
+        staged_records = records_path(tmp_path)
+        retired_path = DB_PATH.with_name(f'{DB_PATH.name}.{os.getpid()}.{threading.get_ident()}.retired.tmp')
+        pending = None
+        try:
+            try:
+                with open(staged_records, 'w+b') as f:
+                    meta = _snapshots.extract(snapshot_id, f)
+                with open(tmp_path, 'wb') as f:
+                    write_users_document(staged_records, f)
+                    f.flush()
+                    os.fsync(f.fileno())
+                # Renames keep the signature the record store is marked with here
+                retarget(staged_records, tmp_path)
+                credential_entries = CredentialIndex.load_entries(meta['credentials'])
+            except (OSError, EOFError, ValueError, KeyError, TypeError, zlib.error) as e:
+                return None, f'Snapshot {snapshot_id} is unreadable: {e}'
+
+            with _write_lock():
+                # The state being replaced becomes a snapshot of its own, so a restore can be undone
+                if backup:
+                    pending = Database._pin_snapshot(label='before-restore')
+                # Freeing the replaced files' blocks takes longer than the renames;
+                # keep them linked until the lock is released
+                for live, retired in ((DB_PATH, retired_path), (records_path(DB_PATH), records_path(retired_path))):
+                    try:
+                        os.link(live, retired)
+                    except OSError:
+                        pass
+                os.replace(tmp_path, DB_PATH)
+                os.replace(staged_records, records_path(DB_PATH))
+                _credentials.rebuild(entries=credential_entries)
+                # A change without a user row makes clients refetch everything
+                change = _changes.append('database.restored', snapshot=snapshot_id, snapshot_seq=snapshot['seq'])
+        except BaseException:
+            if pending:
+                _snapshots.discard(pending)
+            raise
+        finally:
+            for leftover in (tmp_path, staged_records, retired_path, records_path(retired_path)):
+                if leftover.exists():
+                    leftover.unlink()
+
+        return {
+            'restored': snapshot,
+            'backup': _snapshots.finish(pending) if pending else None,
+            'last_seq': change['seq'],
+        }, None
 
     @staticmethod
     def get_payroll_record(user_id, month):
@@ -241,4 +703,13 @@ class Database:
         history, error = Database.get_payroll_history(user_id)
         if error:
             return None, error
-        return next((r for r in history if r.get('month') == month), None), None
+        return payroll.find_record(history, month), None
+
+def _load_normalized_users():
+    return Database.get_all_users()
+
+
+_record_store = RecordStore(lambda: DB_PATH, _load_normalized_users, _try_write_lock)
+_credentials = CredentialIndex(lambda: DB_PATH, _load_normalized_users)
+_changes = ChangeLog(lambda: DB_PATH)
+_snapshots = SnapshotStore(lambda: DB_PATH, keep=SNAPSHOT_KEEP)
@@ -0,0 +1,10 @@
+from django.conf import settings
+from django.contrib.auth import hashers
+
+
+class PBKDF2PasswordHasher(hashers.PBKDF2PasswordHasher):
+    """Django's PBKDF2-SHA256 with the iteration count read from ``PASSWORD_HASH_ITERATIONS``"""
+
+    @property
+    def iterations(self):
+        return settings.PASSWORD_HASH_ITERATIONS
@@ -0,0 +1,61 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from manage.db import Database
+
+
+class Command(BaseCommand):
+    help = "Apply bulk adjustment rules (percent/add/set/recompute_net) to one month's payroll"
+
+    def add_arguments(self, parser):
+        parser.add_argument('month', help='Payroll month to adjust (YYYY-MM)')
+        parser.add_argument(
+            '--rule', action='append', default=[], dest='rules',
+            help='Rule as JSON, e.g. \'{"op": "percent", "field": "base_salary", "value": 5, '
+                 '"where": {"department": "Sales"}}\'; repeatable, applied in order',
+        )
+        parser.add_argument('--rules-file', help='JSON file holding a list of rules')
+        parser.add_argument('--user', type=int, action='append', dest='user_ids', help='Limit to this user ID; repeatable')
+        parser.add_argument('--dry-run', action='store_true', help='Preview the diff without writing')
+        parser.add_argument('--show', type=int, default=20, help='Diff rows to print')
+
+    def handle(self, *args, **options):
+        try:
+            rules = [json.loads(rule) for rule in options['rules']]
+            if options['rules_file']:
+                with open(options['rules_file']) as f:
+                    rules += json.load(f)
+        except (OSError, ValueError) as e:
+            raise CommandError(f'Could not read rules: {e}')
+
+        start = time.perf_counter()
+        report, error = Database.adjust_payroll(
+            options['month'],
+            rules,
+            user_ids=options['user_ids'],
+            dry_run=options['dry_run'],
+            preview_limit=options['show'],
+        )
+        if error:
+            raise CommandError(error)
+        elapsed = time.perf_counter() - start
+
+        for number, matched in enumerate(report['matched'], 1):
+            self.stdout.write(f'  rule {number}: {matched} row(s) selected')
+        for row in report['diff']:
+            changes = ', '.join(
+                f"{field} {row['before'][field]:,.2f} -> {row['after'][field]:,.2f}"
+                for field in row['before'] if row['before'][field] != row['after'][field]
+            )
+            self.stdout.write(f"  #{row['user_id']} {row['username']}: {changes}")
+        if report['changed'] > len(report['diff']):
+            self.stdout.write(f"  ... and {report['changed'] - len(report['diff'])} more")
+        for field, total in report['totals'].items():
+            self.stdout.write(f"  total {field}: {total['before']:,.2f} -> {total['after']:,.2f}")
+
+        verb = 'Would change' if report['dry_run'] else 'Changed'
+        self.stdout.write(f"{verb} {report['changed']} of {report['rows']} record(s) for {report['month']}")
+        rate = report['rows'] / elapsed if elapsed else 0
+        self.stdout.write(f"  {report['rows']} record(s) in {elapsed * 1000:.1f} ms ({rate:,.0f}/s)")
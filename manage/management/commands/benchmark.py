@@ -0,0 +1,355 @@
+import gc
+import hashlib
+import io
+import json
+import random
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, make_password
+from django.core.management.base import BaseCommand, CommandError
+
+from manage import adjustments, db, serializers
+from manage.db import Database
+
+DEPARTMENTS = ['Sales', 'Finance', 'Engineering', 'Operations', 'Management']
+
+
+def synthetic_users(count, months=12):
+    """Build ``count`` realistic-looking users with ``months`` of payroll"""
+    rng = random.Random(count)
+    users = []
+    for user_id in range(1, count + 1):
+        base = rng.randrange(4_000_000, 20_000_000, 50_000)
+        history = []
+        for m in range(months, 0, -1):
+            allowances = rng.choice([0, 250_000, 500_000])
+            deductions = rng.choice([0, 100_000])
+            history.append({
+                'month': f'2025-{m:02d}',
+                'base_salary': float(base),
+                'allowances': float(allowances),
+                'deductions': float(deductions),
+                'net_salary': float(base + allowances - deductions),
+                'notes': '',
+                'status': 'transferred',
+                'created_at': f'2025-{m:02d}-25T09:00:00',
+                'updated_at': f'2025-{m:02d}-25T09:00:00',
+            })
+        users.append({
+            'id': user_id,
+            'username': f'user{user_id}',
+            'email': f'user{user_id}@example.com',
+            'password': 'password',
+            'role': 'user',
+            'full_name': f'Employee {user_id}',
+            'created_at': '2024-01-01T00:00:00',
+            'is_active': True,
+            'email_verified': True,
+            'verification_token': None,
+            'verification_sent_at': None,
+            'verification_expires_at': None,
+            'profile_picture': None,
+            'department': rng.choice(DEPARTMENTS),
+            'position': 'Staff',
+            'phone': '',
+            'emergency_contact_name': '',
+            'emergency_contact_phone': '',
+            'payroll_history': history,
+        })
+    return users
+
+
+@contextmanager
+def temporary_database(users):
+    """Point ``manage.db`` at a scratch users.json for the duration"""
+    original = db.DB_PATH
+    with tempfile.TemporaryDirectory() as tmp:
+        db.DB_PATH = Path(tmp) / 'users.json'
+        try:
+            Database.save({'users': users})
+            yield db.DB_PATH
+        finally:
+            db.DB_PATH = original
+
+
+def round_trip_errors(data):
+    """Every codec must load what every other codec writes, unchanged"""
+    errors = []
+    written = {name: codec.dumps(data) for name, codec in serializers.CODECS.items()}
+    for writer, raw in written.items():
+        for reader, codec in serializers.CODECS.items():
+            if codec.loads(raw) != data:
+                errors.append(f'{reader} does not read back what {writer} wrote')
+    stream, compact = serializers.CODECS['json-stream'], serializers.CODECS['json']
+    buffer = io.BytesIO()
+    stream.dump(data, buffer)
+    if buffer.getvalue() != written['json'] or stream.dumps(data) != compact.dumps(data):
+        errors.append('json-stream output differs from json')
+    return errors
+
+
+def _timed(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+
+class Command(BaseCommand):
+    help = 'Run storage micro-benchmarks against a synthetic database'
+
+    targets = ('user_store', 'payroll_adjust', 'hashers', 'codecs', 'snapshots')
+
+    def add_arguments(self, parser):
+        parser.add_argument('target', choices=self.targets)
+        parser.add_argument('--users', type=int, default=10000, help='Synthetic users to generate')
+        parser.add_argument('--repeat', type=int, default=200, help='Iterations per measurement')
+
+    def handle(self, *args, **options):
+        if options['users'] < 1:
+            raise CommandError('--users must be at least 1')
+        getattr(self, f"bench_{options['target']}")(options['users'], options['repeat'])
+
+    def report(self, label, seconds):
+        self.stdout.write(f'  {label:<40} {seconds * 1000:10.3f} ms')
+
+    def bench_user_store(self, count, repeat):
+        """Single-record reads: full JSON parse vs the mmap record store"""
+        users = synthetic_users(count)
+        rng = random.Random(0)
+        ids = [rng.randint(1, count) for _ in range(repeat)]
+        names = [f'user{i}' for i in ids]
+
+        with temporary_database(users) as path:
+            size = path.stat().st_size
+            self.stdout.write(f'user_store: {count} users, users.json {size / 1e6:.1f} MB')
+
+            def full_parse():
+                target = ids[rng.randrange(repeat)]
+                with open(path) as f:
+                    data = json.load(f)
+                next(u for u in data['users'] if u['id'] == target)
+
+            # The first call maps the file; measure steady state afterwards
+            Database.get_user_by_id(1)
+            lookups = iter(ids * 2)
+            username_lookups = iter(names * 2)
+
+            parse_cost = _timed(full_parse, max(1, min(repeat, 20)))
+            by_id_cost = _timed(lambda: Database.get_user_by_id(next(lookups)), repeat)
+            by_name_cost = _timed(lambda: Database.get_user_by_username(next(username_lookups)), repeat)
+
+            self.report('full parse + scan (per lookup)', parse_cost)
+            self.report('record store get_user_by_id', by_id_cost)
+            self.report('record store get_user_by_username', by_name_cost)
+            self.stdout.write(f'  speedup (by id): {parse_cost / by_id_cost:.0f}x')
+
+    def bench_payroll_adjust(self, count, repeat):
+        """Bulk rules over one month: column passes, dry run and a single-write commit"""
+        users = synthetic_users(count, months=1)
+        month = users[0]['payroll_history'][0]['month']
+        raw_rules = [
+            {'op': 'percent', 'field': 'base_salary', 'value': 5, 'where': {'department': 'Sales'}},
+            {'op': 'set', 'field': 'allowances', 'value': 750000, 'where': {'department': 'Engineering'}},
+            {'op': 'recompute_net', 'where': {}},
+        ]
+        rules, _ = adjustments.parse_rules(raw_rules)
+        runs = max(1, min(repeat, 5))
+        self.stdout.write(f'payroll_adjust: {count} payroll rows for {month}')
+
+        columns = adjustments.PayrollColumns(users, month)
+        build_cost = _timed(lambda: adjustments.PayrollColumns(users, month), runs)
+
+        def apply_rules():
+            for rule in rules:
+                columns.apply(rule)
+            columns.recompute_net()
+            return columns.changed_rows()
+
+        apply_cost = _timed(apply_rules, runs)
+        changed = len(apply_rules())
+        self.report('load month into columns', build_cost)
+        self.report(f'apply {len(rules)} rules + diff ({changed} changed)', apply_cost)
+
+        with temporary_database(users):
+            start = time.perf_counter()
+            Database.adjust_payroll(month, raw_rules, dry_run=True)
+            self.report('dry run (load + compute)', time.perf_counter() - start)
+
+            start = time.perf_counter()
+            report, _ = Database.adjust_payroll(month, raw_rules)
+            commit_cost = time.perf_counter() - start
+            self.report('commit (load + compute + one save)', commit_cost)
+
+            # What the same change costs through the payroll form, one save per employee
+            record = dict(users[-1]['payroll_history'][0])
+            start = time.perf_counter()
+            Database.upsert_payroll_record(count, record)
+            upsert_cost = time.perf_counter() - start
+            self.report('one per-employee upsert', upsert_cost)
+            self.stdout.write(
+                f"  {report['changed']} upserts would take ~{upsert_cost * report['changed']:.0f} s; "
+                f"one commit took {commit_cost:.1f} s"
+            )
+
+    def bench_hashers(self, count, repeat):
+        """Password verification cost per PBKDF2 setting, and login timing by outcome"""
+        runs = max(1, min(repeat, 20))
+        configured = settings.PASSWORD_HASH_ITERATIONS
+        self.stdout.write(f'hashers: PBKDF2-SHA256, PASSWORD_HASH_ITERATIONS={configured:,}')
+        try:
+            for iterations in sorted({100_000, 260_000, 600_000, 1_000_000, configured}):
+                settings.PASSWORD_HASH_ITERATIONS = iterations
+                encoded = make_password('password')
+                cost = _timed(lambda: check_password('password', encoded), runs)
+                self.stdout.write(f'  verify @ {iterations:<9,} iterations {cost * 1000:20.3f} ms'
+                                  f' {1 / cost:8.1f} logins/s per core')
+        finally:
+            settings.PASSWORD_HASH_ITERATIONS = configured
+
+        users = synthetic_users(count, months=1)
+        encoded = make_password('password')
+        for user in users:
+            user['password'] = encoded
+
+        with temporary_database(users):
+            Database.authenticate('user1', 'password')
+            self.stdout.write(f'authenticate against {count} users (credential index):')
+            cases = {
+                'right password': ('user1', 'password'),
+                'wrong password': ('user1', 'nope'),
+                'unknown user': ('nobody', 'password'),
+            }
+            # Interleaved, so drift in CPU speed hits every case alike
+            samples = {label: [] for label in cases}
+            for _ in range(runs):
+                for label, args in cases.items():
+                    samples[label].append(_timed(lambda: Database.authenticate(*args), 1))
+            for label, values in samples.items():
+                self.report(f'{label} (median)', sorted(values)[len(values) // 2])
+
+    def bench_codecs(self, count, repeat):
+        """users.json size, save and load time per codec, after a round-trip check"""
+        users = synthetic_users(count)
+        # Values that tend to break codecs: non-ASCII, float repr, big ints, nulls
+        users[0].update(full_name='Zoë Ångström 山田', notes=None, phone='+62 812\u20283456')
+        users[0]['payroll_history'][0].update(base_salary=1099999.9, allowances=0.1, deductions=2 ** 53 + 1)
+        data = {'users': users}
+
+        errors = round_trip_errors(data)
+        if errors:
+            raise CommandError('Round-trip check failed:\n  ' + '\n  '.join(errors))
+        self.stdout.write(f"codecs: {count} users, round trip OK across {', '.join(serializers.CODECS)}")
+        self.stdout.write(f"  default (UMD_DB_CODEC): {db.CODEC.name}")
+
+        runs = max(1, min(repeat, 3))
+        self.stdout.write(f"  {'codec':<14} {'size MB':>9} {'save ms':>10} {'load ms':>10}")
+        with tempfile.TemporaryDirectory() as tmp:
+            for name, codec in serializers.CODECS.items():
+                path = Path(tmp) / f'{name}.json'
+
+                def save():
+                    with open(path, 'wb') as f:
+                        codec.dump(data, f)
+
+                def load():
+                    with open(path, 'rb') as f:
+                        codec.load(f)
+
+                save_cost = _timed(save, runs)
+                load_cost = _timed(load, runs)
+                self.stdout.write(f'  {name:<14} {path.stat().st_size / 1e6:>9.1f} '
+                                  f'{save_cost * 1000:>10.1f} {load_cost * 1000:>10.1f}')
+
+    def bench_snapshots(self, count, repeat):
+        """Snapshot and restore time, how long each holds writers off, and reads meanwhile"""
+        users = synthetic_users(count)
+        for user in users:
+            Database._normalize_user(user)
+        digest = lambda users: hashlib.sha256(json.dumps(users, sort_keys=True).encode()).hexdigest()
+        expected = digest(users)
+        runs = max(1, min(repeat, 3))
+
+        write_lock = db._write_lock
+        holds = []
+
+        @contextmanager
+        def timed_write_lock():
+            with write_lock():
+                start = time.perf_counter()
+                try:
+                    yield
+                finally:
+                    holds.append(time.perf_counter() - start)
+
+        def during(action, read=True):
+            """Run ``action``, optionally with another thread reading in a loop;
+            returns (elapsed, time writers were held off, longest read)"""
+            stop = threading.Event()
+            reads = []
+
+            def reader():
+                while not stop.is_set():
+                    start = time.perf_counter()
+                    Database.get_user_by_id(count)
+                    reads.append(time.perf_counter() - start)
+                    time.sleep(0.001)
+
+            thread = threading.Thread(target=reader)
+            if read:
+                thread.start()
+            holds.clear()
+            db._write_lock = timed_write_lock
+            try:
+                start = time.perf_counter()
+                action()
+                elapsed = time.perf_counter() - start
+            finally:
+                db._write_lock = write_lock
+                stop.set()
+                if read:
+                    thread.join()
+            return elapsed, sum(holds), max(reads, default=0)
+
+        with temporary_database(users) as path:
+            size = path.stat().st_size
+            self.stdout.write(f'snapshots: {count} users, users.json {size / 1e6:.1f} MB')
+            # A server holds none of these in memory; keeping them alive would make every
+            # garbage collection pass during the runs below walk millions of objects
+            users.clear()
+            gc.collect()
+            Database.get_user_by_id(1)
+
+            snapshot_cost = _timed(Database.snapshot, runs)
+            snapshot = Database.list_snapshots()[0]
+            self.report('snapshot (pin + gzip -1)', snapshot_cost)
+            self.stdout.write(f"  snapshot size: {snapshot['bytes'] / 1e6:.1f} MB "
+                              f"({size / snapshot['bytes']:.1f}x smaller than users.json)")
+            self.report('  writers held off', during(Database.snapshot, read=False)[1])
+
+            restore = lambda: Database.restore_snapshot(snapshot['id'], backup=False)
+            restore_cost = _timed(restore, runs)
+            if digest(Database.get_all_users()) != expected:
+                raise CommandError('Restored users differ from the snapshotted ones')
+            self.report('restore (gunzip + write users.json + swap)', restore_cost)
+            self.report('  writers held off', during(restore, read=False)[1])
+            backup_restore = lambda: Database.restore_snapshot(snapshot['id'])
+            self.report('restore with a before-restore snapshot', _timed(backup_restore, runs))
+            self.report('  writers held off', during(backup_restore, read=False)[1])
+
+            # Reads never wait for the lock; with one core, the GIL is what they wait for
+            for label, action in (('snapshot', Database.snapshot), ('restore', restore)):
+                _, held, longest_read = during(action)
+                self.report(f'{label} with a reader running: longest read', longest_read)
+                self.report('  writers held off', held)
+
+            # Restore installs the snapshot's record store; the next read maps it but never rebuilds it
+            start = time.perf_counter()
+            Database.get_user_by_id(count)
+            self.report('first read after restore', time.perf_counter() - start)
+            self.stdout.write('  restored users match the snapshotted ones')
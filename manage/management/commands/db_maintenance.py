@@ -0,0 +1,80 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from manage.db import Database
+from manage.views import UPLOAD_DIR
+
+
+def collect_orphan_uploads(upload_dir, referenced, grace_seconds, dry_run=False):
+    """Delete upload files no user references; returns (removed names, bytes)"""
+    removed = []
+    reclaimed = 0
+    cutoff = time.time() - grace_seconds
+    try:
+        entries = list(os.scandir(upload_dir))
+    except FileNotFoundError:
+        return removed, reclaimed
+
+    for entry in entries:
+        if entry.name.startswith('.') or not entry.is_file() or entry.name in referenced:
+            continue
+        st = entry.stat()
+        # A picture is written before the user row points at it; leave young files alone
+        if st.st_mtime > cutoff:
+            continue
+        if not dry_run:
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                continue
+        removed.append(entry.name)
+        reclaimed += st.st_size
+    return removed, reclaimed
+
+
+class Command(BaseCommand):
+    help = 'Compact users.json, clear stale verification tokens, check uniqueness and remove orphaned uploads'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Report what would change without writing or deleting')
+        parser.add_argument(
+            '--grace-minutes', type=int, default=60,
+            help='Only delete unreferenced uploads older than this (default: 60)',
+        )
+
+    def handle(self, *args, **options):
+        if options['grace_minutes'] < 0:
+            raise CommandError('--grace-minutes cannot be negative')
+
+        start = time.perf_counter()
+        report = Database.compact(dry_run=options['dry_run'])
+        compact_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        removed, upload_bytes = collect_orphan_uploads(
+            UPLOAD_DIR,
+            set(report['profile_pictures']),
+            options['grace_minutes'] * 60,
+            dry_run=options['dry_run'],
+        )
+        gc_time = time.perf_counter() - start
+
+        db_bytes = report['bytes_before'] - report['bytes_after']
+        prefix = 'Would reclaim' if report['dry_run'] else 'Reclaimed'
+        self.stdout.write(f"users.json: {report['users']} user(s), "
+                          f"{report['bytes_before']:,} -> {report['bytes_after']:,} bytes "
+                          f"in {compact_time * 1000:.1f} ms")
+        self.stdout.write(f"  verification tokens cleared: {report['tokens_cleared']}")
+        self.stdout.write(f"uploads: {len(removed)} orphaned file(s), {upload_bytes:,} bytes "
+                          f"in {gc_time * 1000:.1f} ms")
+        for name in removed:
+            self.stdout.write(f'  {name}')
+        self.stdout.write(f'{prefix} {db_bytes + upload_bytes:,} bytes')
+
+        if report['duplicates']:
+            for key, pairs in report['duplicates'].items():
+                for first, second in pairs:
+                    self.stderr.write(f'duplicate {key}: users #{first} and #{second}')
+            raise CommandError('Uniqueness check failed')
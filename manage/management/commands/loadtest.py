@@ -0,0 +1,330 @@
+import http.client
+import io
+import json
+import math
+import sys
+import threading
+import time
+from collections import defaultdict
+from contextlib import nullcontext
+from http.cookies import SimpleCookie
+from pathlib import Path
+from urllib.parse import urlsplit
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+
+from manage.management.commands.benchmark import synthetic_users, temporary_database
+
+ADMIN_USERNAME = 'loadadmin'
+ADMIN_PASSWORD = 'loadadmin'
+EMPLOYEE_PASSWORD = 'password'
+
+
+def loadtest_users(count):
+    """``count`` employees (user1..userN, password ``password``) plus one admin"""
+    users = synthetic_users(count)
+    # Hashed up front, like real accounts, so logins don't turn into rehash writes
+    employee_hash = make_password(EMPLOYEE_PASSWORD)
+    for user in users:
+        user['password'] = employee_hash
+    admin = dict(users[0], id=count + 1, username=ADMIN_USERNAME, email='loadadmin@example.com',
+                 password=make_password(ADMIN_PASSWORD), role='admin', full_name='Load Test Admin',
+                 payroll_history=[])
+    return users + [admin]
+
+
+def write_month(n):
+    """A distinct month per admin write, counting down from 2999-12 so it never hits real data"""
+    ordinal = 2999 * 12 + 11 - n
+    return f'{ordinal // 12:04d}-{ordinal % 12 + 1:02d}'
+
+
+class _Client:
+    """Cookie-keeping JSON client; one per virtual user"""
+
+    def __init__(self):
+        self.cookies = {}
+
+    def request(self, method, path, data=None):
+        headers = {}
+        body = b''
+        if data is not None:
+            body = json.dumps(data).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+        if self.cookies:
+            headers['Cookie'] = '; '.join(f'{k}={v}' for k, v in self.cookies.items())
+        if method != 'GET' and 'csrftoken' in self.cookies:
+            headers['X-CSRFToken'] = self.cookies['csrftoken']
+
+        status, response_headers, content = self._send(method, path, body, headers)
+        for name, value in response_headers:
+            if name.lower() == 'set-cookie':
+                cookie = SimpleCookie()
+                cookie.load(value)
+                for key, morsel in cookie.items():
+                    if morsel.value and morsel['max-age'] != '0':
+                        self.cookies[key] = morsel.value
+                    else:
+                        self.cookies.pop(key, None)
+        return status, content
+
+
+class WSGIClient(_Client):
+    """Calls a WSGI application directly, in this process"""
+
+    def __init__(self, application, host='localhost'):
+        super().__init__()
+        self.application = application
+        self.host = host
+
+    def _send(self, method, path, body, headers):
+        path, _, query = path.partition('?')
+        environ = {
+            'REQUEST_METHOD': method,
+            'PATH_INFO': path,
+            'QUERY_STRING': query,
+            'SERVER_NAME': self.host,
+            'SERVER_PORT': '80',
+            'SERVER_PROTOCOL': 'HTTP/1.1',
+            'REMOTE_ADDR': '127.0.0.1',
+            'HTTP_HOST': self.host,
+            'CONTENT_LENGTH': str(len(body)),
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': 'http',
+            'wsgi.input': io.BytesIO(body),
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+        }
+        for name, value in headers.items():
+            key = name.upper().replace('-', '_')
+            environ[key if key == 'CONTENT_TYPE' else f'HTTP_{key}'] = value
+
+        response = {}
+
+        def start_response(status, response_headers, exc_info=None):
+            response['status'] = int(status.split(' ', 1)[0])
+            response['headers'] = response_headers
+
+        result = self.application(environ, start_response)
+        try:
+            content = b''.join(result)
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+        return response['status'], response['headers'], content
+
+
+class HTTPClient(_Client):
+    """Talks HTTP/1.1 to a running server over one keep-alive connection"""
+
+    def __init__(self, base_url):
+        super().__init__()
+        parts = urlsplit(base_url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.connection = None
+
+    def _send(self, method, path, body, headers):
+        for attempt in range(2):
+            if self.connection is None:
+                self.connection = http.client.HTTPConnection(self.host, self.port, timeout=60)
+            try:
+                self.connection.request(method, path, body=body or None, headers=headers)
+                response = self.connection.getresponse()
+                return response.status, response.getheaders(), response.read()
+            except (ConnectionError, http.client.HTTPException):
+                # The server may close idle keep-alive connections; retry once
+                self.connection.close()
+                self.connection = None
+                if attempt:
+                    raise
+
+
+class Stats:
+    """Per-endpoint latencies and error counts, shared by all virtual users"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def timed(self, label, call):
+        start = time.perf_counter()
+        try:
+            status, content = call()
+        except Exception:
+            status, content = None, b''
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.latencies[label].append(elapsed)
+            if status != 200:
+                self.errors[label] += 1
+        return status, content
+
+
+def _percentile(sorted_values, q):
+    return sorted_values[max(0, math.ceil(q * len(sorted_values)) - 1)]
+
+
+def employee_session(client, username, iterations, stats, think):
+    """login -> dashboard -> /api/payroll/me -> PDF of the latest month"""
+    for _ in range(iterations):
+        client.cookies.clear()
+        stats.timed('GET /login', lambda: client.request('GET', '/login'))
+        status, content = stats.timed('POST /login', lambda: client.request(
+            'POST', '/login', {'username': username, 'password': EMPLOYEE_PASSWORD}))
+        if status != 200:
+            continue
+        user_id = json.loads(content)['user']['id']
+
+        stats.timed('GET /dashboard', lambda: client.request('GET', '/dashboard'))
+        status, content = stats.timed('GET /api/payroll/me', lambda: client.request('GET', '/api/payroll/me?limit=24'))
+        if status == 200:
+            history = json.loads(content)['payroll_history']
+            if history:
+                month = history[0]['month']
+                stats.timed('GET /api/payroll/<id>/pdf', lambda: client.request(
+                    'GET', f'/api/payroll/{user_id}/pdf?month={month}'))
+        time.sleep(think)
+
+
+def admin_session(client, iterations, stats, think, next_write, employee_ids, written):
+    """login once, then /api/users plus one payroll upsert per iteration"""
+    client.request('GET', '/login')
+    status, _ = stats.timed('POST /login', lambda: client.request(
+        'POST', '/login', {'username': ADMIN_USERNAME, 'password': ADMIN_PASSWORD}))
+    if status != 200:
+        return
+
+    for _ in range(iterations):
+        stats.timed('GET /api/users', lambda: client.request('GET', '/api/users'))
+
+        n = next_write()
+        user_id = employee_ids[n % len(employee_ids)]
+        month = write_month(n)
+        base_salary = 5_000_000 + n
+        status, _ = stats.timed('POST /api/payroll/<id>/upsert', lambda: client.request(
+            'POST', f'/api/payroll/{user_id}/upsert',
+            {'month': month, 'base_salary': base_salary, 'allowances': 0, 'deductions': 0, 'notes': 'loadtest'}))
+        if status == 200:
+            written.append((user_id, month, float(base_salary)))
+        time.sleep(think)
+
+
+def lost_writes(db_path, written):
+    """Acknowledged upserts that are missing from (or wrong in) ``db_path``"""
+    with open(db_path) as f:
+        data = json.load(f)
+    records = {
+        (user['id'], record.get('month')): record
+        for user in data.get('users', [])
+        for record in user.get('payroll_history', [])
+    }
+    return [w for w in written if (records.get(w[:2]) or {}).get('base_salary') != w[2]]
+
+
+class Command(BaseCommand):
+    help = 'Drive the WSGI app (in-process, or a server via --url) with concurrent employee and admin sessions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--employees', type=int, default=50, help='Concurrent employee virtual users')
+        parser.add_argument('--admins', type=int, default=2, help='Concurrent admin virtual users')
+        parser.add_argument('--iterations', type=int, default=3, help='Script repetitions per virtual user')
+        parser.add_argument('--think-ms', type=int, default=0, help='Pause between iterations')
+        parser.add_argument('--users', type=int, default=200, help='Employees in the synthetic database')
+        parser.add_argument('--url', help='Target a running server (e.g. http://127.0.0.1:8000) instead of in-process')
+        parser.add_argument('--db', help="With --url: the server's users.json, checked for lost writes afterwards")
+        parser.add_argument('--prepare-db', help='Write the synthetic database to this path for a server, then exit')
+
+    def handle(self, *args, **options):
+        if options['users'] < 1 or options['employees'] < 0 or options['admins'] < 0 or options['iterations'] < 1:
+            raise CommandError('--users and --iterations must be positive; virtual user counts cannot be negative')
+        users = loadtest_users(options['users'])
+
+        if options['prepare_db']:
+            path = Path(options['prepare_db'])
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(json.dumps({'users': users}), encoding='utf-8')
+            self.stdout.write(f"Wrote {options['users']} employees + admin '{ADMIN_USERNAME}' to {path}")
+            self.stdout.write(f'Start the server with UMD_DB_PATH={path}, then run loadtest --url ... --db {path}')
+            return
+
+        if options['url']:
+            make_client = lambda: HTTPClient(options['url'])
+            database = nullcontext(Path(options['db']) if options['db'] else None)
+            target = options['url']
+        else:
+            from config.wsgi import application
+            make_client = lambda: WSGIClient(application)
+            database = temporary_database(users)
+            target = 'config.wsgi.application (in-process)'
+
+        with database as db_path:
+            self.run_load(options, users, make_client, target, db_path)
+
+    def run_load(self, options, users, make_client, target, db_path):
+        stats = Stats()
+        written = []
+        counter = iter(range(sys.maxsize))
+        counter_lock = threading.Lock()
+
+        def next_write():
+            with counter_lock:
+                return next(counter)
+
+        employee_ids = [u['id'] for u in users if u['role'] == 'user']
+        think = options['think_ms'] / 1000
+        sessions = [
+            (employee_session, (make_client(), f'user{employee_ids[i % len(employee_ids)]}',
+                                options['iterations'], stats, think))
+            for i in range(options['employees'])
+        ] + [
+            (admin_session, (make_client(), options['iterations'], stats, think, next_write, employee_ids, written))
+            for _ in range(options['admins'])
+        ]
+        if not sessions:
+            raise CommandError('Nothing to do: no virtual users')
+
+        # Everyone starts at once, like a payday rush
+        barrier = threading.Barrier(len(sessions) + 1)
+
+        def run(session, args):
+            barrier.wait()
+            session(*args)
+
+        threads = [threading.Thread(target=run, args=s, daemon=True) for s in sessions]
+        for thread in threads:
+            thread.start()
+        barrier.wait()
+        start = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        self.stdout.write(f"{target}: {options['employees']} employee + {options['admins']} admin virtual users, "
+                          f"{options['iterations']} iteration(s), {elapsed:.2f} s")
+        self.stdout.write(f"  {'endpoint':<32} {'reqs':>6} {'err %':>6} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8}")
+        total = errors = 0
+        for label, latencies in stats.latencies.items():
+            latencies.sort()
+            total += len(latencies)
+            errors += stats.errors[label]
+            self.stdout.write(
+                f'  {label:<32} {len(latencies):>6} {stats.errors[label] / len(latencies) * 100:>6.1f} '
+                f'{len(latencies) / elapsed:>8.1f} {_percentile(latencies, 0.5) * 1000:>8.1f} '
+                f'{_percentile(latencies, 0.99) * 1000:>8.1f}'
+            )
+        self.stdout.write(f"  {'total':<32} {total:>6} {errors / max(total, 1) * 100:>6.1f} {total / elapsed:>8.1f}")
+
+        if db_path is None:
+            self.stdout.write(f'{len(written)} write(s) acknowledged; pass --db to check them against users.json')
+            return
+        lost = lost_writes(db_path, written)
+        self.stdout.write(f'{len(written)} write(s) acknowledged, {len(lost)} missing from {db_path}')
+        if lost:
+            for user_id, month, base_salary in lost[:20]:
+                self.stderr.write(f'  lost: user #{user_id} {month} base_salary={base_salary:,.0f}')
+            raise CommandError('Writes were lost')
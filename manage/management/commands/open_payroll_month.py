@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from manage.db import Database
+
+
+class Command(BaseCommand):
+    help = 'Open a payroll month: a pending record for every active employee, carried over from their last month'
+
+    def add_arguments(self, parser):
+        parser.add_argument('month', help='Month to open (YYYY-MM)')
+        parser.add_argument('--dry-run', action='store_true', help='Report what would be created without writing')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        report, error = Database.open_payroll_month(options['month'], dry_run=options['dry_run'])
+        if error:
+            raise CommandError(error)
+        elapsed = time.perf_counter() - start
+
+        processed = report['created'] + report['skipped_existing'] + report['skipped_no_history']
+        verb = 'Would create' if report['dry_run'] else 'Created'
+        self.stdout.write(f"{verb} {report['created']} pending record(s) for {report['month']}")
+        self.stdout.write(f"  already had {report['month']}: {report['skipped_existing']}")
+        self.stdout.write(f"  no earlier payroll to carry over: {report['skipped_no_history']}")
+        rate = processed / elapsed if elapsed else 0
+        self.stdout.write(f"  {processed} employee(s) in {elapsed * 1000:.1f} ms ({rate:,.0f}/s)")
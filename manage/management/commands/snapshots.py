@@ -0,0 +1,51 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from manage.db import Database
+
+
+class Command(BaseCommand):
+    help = 'List, take or restore compressed point-in-time snapshots of users.json'
+
+    def add_arguments(self, parser):
+        parser.add_argument('action', nargs='?', default='list', choices=['list', 'create', 'restore'])
+        parser.add_argument('snapshot_id', nargs='?', help='With restore: the snapshot to restore')
+        parser.add_argument('--keep', type=int, help='With create: snapshots to retain (default: UMD_SNAPSHOT_KEEP)')
+        parser.add_argument('--no-backup', action='store_true',
+                            help='With restore: do not snapshot the current state first')
+
+    def handle(self, *args, **options):
+        if options['keep'] is not None and options['keep'] < 1:
+            raise CommandError('--keep must be at least 1')
+        getattr(self, f"handle_{options['action']}")(options)
+
+    def handle_list(self, options):
+        snapshots = Database.list_snapshots()
+        if not snapshots:
+            self.stdout.write('No snapshots')
+            return
+        for snapshot in snapshots:
+            label = f" ({snapshot['label']})" if snapshot['label'] else ''
+            self.stdout.write(f"{snapshot['id']}  seq {snapshot['seq']:<8} {snapshot['bytes']:>14,} bytes{label}")
+
+    def handle_create(self, options):
+        start = time.perf_counter()
+        snapshot = Database.snapshot(keep=options['keep'])
+        elapsed = time.perf_counter() - start
+        self.stdout.write(f"Created {snapshot['id']} ({snapshot['bytes']:,} bytes) in {elapsed * 1000:.1f} ms")
+
+    def handle_restore(self, options):
+        if not options['snapshot_id']:
+            raise CommandError('restore needs a snapshot id (see: manage.py snapshots list)')
+
+        start = time.perf_counter()
+        report, error = Database.restore_snapshot(options['snapshot_id'], backup=not options['no_backup'])
+        elapsed = time.perf_counter() - start
+        if error:
+            raise CommandError(error)
+
+        self.stdout.write(f"Restored {report['restored']['id']} in {elapsed * 1000:.1f} ms "
+                          f"(change seq {report['last_seq']})")
+        if report['backup']:
+            self.stdout.write(f"  previous state saved as {report['backup']['id']}")
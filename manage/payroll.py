@@ -0,0 +1,172 @@
+"""Month-indexed helpers for a user's embedded payroll history.
+
+History lists are kept sorted newest month first (index 0 is the latest
+record, which the UI relies on), so lookups and range queries bisect on the
+negated month ordinal instead of scanning.
+"""
+import re
+from bisect import bisect_left, bisect_right
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+from functools import lru_cache
+
+MONTH_RE = re.compile(r'^(\d{4})-(0[1-9]|1[0-2])$')
+
+TOTAL_FIELDS = ('gross', 'allowances', 'deductions', 'net')
+
+MONEY_FIELDS = ('base_salary', 'allowances', 'deductions', 'net_salary')
+
+_CENT = Decimal('0.01')
+# Bulk adjustments compute amounts in array('q') columns of cents
+MAX_MINOR = 2 ** 63 - 1
+
+
+def to_minor(value):
+    """Amount as integer cents, rounded half up; None/garbage count as 0"""
+    if not value:
+        return 0
+    if isinstance(value, int) or (isinstance(value, float) and value.is_integer()):
+        # Whole amounts are the common case and need no decimal rounding
+        return int(value) * 100
+    try:
+        # repr() is the shortest string that round-trips, so 0.1 stays 0.1
+        amount = Decimal(repr(value) if isinstance(value, float) else str(value))
+        return int(amount.quantize(_CENT, rounding=ROUND_HALF_UP) * 100)
+    except (InvalidOperation, ValueError):
+        return 0
+
+
+def parse_minor(value):
+    """Input amount as integer cents, rounded half up.
+
+    Raises ValueError if ``value`` is not a finite number or its cents do not
+    fit in 64 bits.
+    """
+    if isinstance(value, int) or (isinstance(value, float) and value.is_integer()):
+        cents = int(value) * 100
+    else:
+        try:
+            amount = Decimal(repr(value) if isinstance(value, float) else str(value))
+        except InvalidOperation:
+            raise ValueError('value must be a number') from None
+        if not amount.is_finite():
+            raise ValueError('value must be a number')
+        if abs(amount) * 100 > MAX_MINOR:
+            raise ValueError('value out of range')
+        cents = int(amount.quantize(_CENT, rounding=ROUND_HALF_UP) * 100)
+    if abs(cents) > MAX_MINOR:
+        raise ValueError('value out of range')
+    return cents
+
+
+def from_minor(cents):
+    """Integer cents back to the float stored in users.json"""
+    # Correctly rounded division: the nearest double to the 2-decimal amount
+    return cents / 100
+
+
+def net_minor(base_salary, allowances, deductions):
+    return base_salary + allowances - deductions
+
+
+# Only a few hundred distinct months ever exist; batch jobs hit this per record
+@lru_cache(maxsize=4096)
+def month_ordinal(month):
+    """Return a sortable integer for ``YYYY-MM``, or None if malformed"""
+    match = MONTH_RE.match(month or '')
+    if not match:
+        return None
+    return int(match.group(1)) * 12 + int(match.group(2)) - 1
+
+
+def is_valid_month(month):
+    return month_ordinal(month) is not None
+
+
+def _key(record):
+    # Malformed months sort after every valid one
+    return -(month_ordinal(record.get('month')) or 0)
+
+
+def sort_history(history):
+    """Sort a history list in place, newest month first"""
+    history.sort(key=_key)
+    return history
+
+
+def _position(history, month):
+    return bisect_left(history, -month_ordinal(month), key=_key)
+
+
+def find_record(history, month):
+    """Get the record for ``month`` or None"""
+    if not is_valid_month(month):
+        return next((r for r in history if r.get('month') == month), None)
+    i = _position(history, month)
+    if i < len(history) and history[i].get('month') == month:
+        return history[i]
+    return None
+
+
+def latest_before(history, month):
+    """Get the newest record strictly older than ``month``"""
+    i = bisect_right(history, -month_ordinal(month), key=_key)
+    return history[i] if i < len(history) else None
+
+
+def upsert_record(history, record):
+    """Insert or replace ``record`` by month, keeping the order; returns the old record"""
+    i = _position(history, record['month'])
+    if i < len(history) and history[i].get('month') == record['month']:
+        previous = history[i]
+        history[i] = record
+        return previous
+    history.insert(i, record)
+    return None
+
+
+def select_range(history, from_month=None, to_month=None):
+    """Slice of records with ``from_month <= month <= to_month`` (newest first)"""
+    start = _position(history, to_month) if to_month else 0
+    end = bisect_right(history, -month_ordinal(from_month), key=_key) if from_month else len(history)
+    return history[start:end]
+
+
+def page(history, from_month=None, to_month=None, limit=None, cursor=None):
+    """One page of a month range; ``cursor`` is the last month already returned.
+
+    Returns ``(records, next_cursor)``; ``next_cursor`` is None on the last page.
+    """
+    records = select_range(history, from_month, to_month)
+    if cursor:
+        records = records[bisect_right(records, -month_ordinal(cursor), key=_key):]
+    if limit is None or len(records) <= limit:
+        return records, None
+    records = records[:limit]
+    return records, records[-1]['month']
+
+
+def empty_totals():
+    return {field: 0.0 for field in TOTAL_FIELDS} | {'months': 0}
+
+
+def year_totals(history, year):
+    """Gross/allowances/deductions/net summed over one calendar year"""
+    # Summed in cents so a year of records doesn't accumulate float error
+    totals = dict.fromkeys(TOTAL_FIELDS, 0) | {'months': 0}
+    for record in select_range(history, f'{year:04d}-01', f'{year:04d}-12'):
+        base = to_minor(record.get('base_salary'))
+        allowances = to_minor(record.get('allowances'))
+        totals['gross'] += base + allowances
+        totals['allowances'] += allowances
+        totals['deductions'] += to_minor(record.get('deductions'))
+        totals['net'] += to_minor(record.get('net_salary'))
+        totals['months'] += 1
+    for field in TOTAL_FIELDS:
+        totals[field] = from_minor(totals[field])
+    return totals
+
+
+def all_year_totals(history):
+    """``{'YYYY': totals}`` for every year present in ``history``"""
+    years = {month_ordinal(r.get('month')) // 12 for r in history if is_valid_month(r.get('month'))}
+    return {str(year): year_totals(history, year) for year in sorted(years)}
@@ -0,0 +1,60 @@
+"""Payroll slip PDF rendering.
+
+Kept free of Django imports so it can run in a worker process.
+"""
+from io import BytesIO
+
+from reportlab.lib.pagesizes import A4
+from reportlab.lib import colors
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
+
+
+def build_payslip_pdf(user, record, month):
+    """Render the payroll slip for ``user``/``record`` and return the PDF bytes"""
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4, title='Slip Gaji')
+    styles = getSampleStyleSheet()
+
+    elements = []
+    elements.append(Paragraph('Slip Gaji (Payroll Slip)', styles['Title']))
+    elements.append(Spacer(1, 12))
+    elements.append(Paragraph(f"Nama: {user.get('full_name', user.get('username'))}", styles['Normal']))
+    elements.append(Paragraph(f"ID: #{user.get('id')}", styles['Normal']))
+    elements.append(Paragraph(f"Department: {user.get('department', '-')}", styles['Normal']))
+    elements.append(Paragraph(f"Position: {user.get('position', '-')}", styles['Normal']))
+    elements.append(Paragraph(f"Periode: {month}", styles['Normal']))
+    elements.append(Spacer(1, 12))
+
+    table_data = [
+        ['Komponen', 'Jumlah'],
+        ['Gaji Pokok', f"Rp {record.get('base_salary', 0):,.2f}"],
+        ['Tunjangan', f"Rp {record.get('allowances', 0):,.2f}"],
+        ['Potongan', f"Rp {record.get('deductions', 0):,.2f}"],
+        ['Total Diterima', f"Rp {record.get('net_salary', 0):,.2f}"]
+    ]
+
+    table = Table(table_data, colWidths=[250, 200])
+    table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#f2f2f2')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.black),
+        ('ALIGN', (1, 1), (-1, -1), 'RIGHT'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 10),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#dddddd')),
+    ]))
+    elements.append(table)
+
+    notes = record.get('notes')
+    if notes:
+        elements.append(Spacer(1, 10))
+        elements.append(Paragraph(f"Catatan: {notes}", styles['Normal']))
+
+    elements.append(Spacer(1, 24))
+    elements.append(Paragraph('Dokumen ini dihasilkan oleh sistem.', styles['Italic']))
+
+    doc.build(elements)
+    pdf = buffer.getvalue()
+    buffer.close()
+    return pdf
@@ -0,0 +1,280 @@
+"""Read-optimized sidecar for the JSON user database.
+
+``users.json.records`` holds one compact JSON record per line, followed by an
+index mapping user id / username / email to the ``(offset, length)`` of that
+line, and a fixed-size trailer pointing at the index and recording the
+``users.json`` signature the file was built against. Readers ``mmap`` the file
+and decode only the bytes of the record they need, straight out of the page
+cache, instead of parsing the whole ``users.json`` document.
+
+The sidecar is rebuilt by the write path (``Database.save``) and, lazily, by
+one reader that notices ``users.json`` changed behind its back or finds the
+sidecar missing or damaged. Readers that
+find it stale while a write is in progress keep using the previous version
+until the writer has regenerated it.
+"""
+import json
+import mmap
+import os
+import struct
+import threading
+from contextlib import nullcontext
+from pathlib import Path
+
+try:
+    import orjson
+except ImportError:  # optional speedup
+    orjson = None
+
+MAGIC = b'UMDR'
+FORMAT_VERSION = 2
+# magic, index offset, index length, format version, source mtime (ns), source size
+_TRAILER = struct.Struct('>4sQIIqQ')
+_CHUNK = 1 << 22
+
+
+def records_path(db_path: Path) -> Path:
+    return db_path.with_name(db_path.name + '.records')
+
+
+def _signature(path: Path):
+    st = os.stat(path)
+    return [st.st_mtime_ns, st.st_size]
+
+
+def _encode(user):
+    if orjson is not None:
+        try:
+            return orjson.dumps(user)
+        except TypeError:
+            pass
+    return json.dumps(user, separators=(',', ':')).encode('utf-8')
+
+
+def _decode(raw):
+    return orjson.loads(raw) if orjson is not None else json.loads(raw)
+
+
+def _unpack_trailer(raw, file_size):
+    """(index offset, index length, source signature) from a records file's trailer"""
+    if file_size < _TRAILER.size:
+        raise ValueError('records file is truncated')
+    magic, index_offset, index_length, version, mtime_ns, size = _TRAILER.unpack(raw)
+    if magic != MAGIC or version != FORMAT_VERSION:
+        raise ValueError('unrecognized records file')
+    if index_offset + index_length + _TRAILER.size != file_size:
+        raise ValueError('records file is truncated')
+    return index_offset, index_length, [mtime_ns, size]
+
+
+def _read_trailer(f):
+    size = f.seek(0, os.SEEK_END)
+    f.seek(max(size - _TRAILER.size, 0))
+    return _unpack_trailer(f.read(_TRAILER.size), size)
+
+
+def source_of(path: Path):
+    """The users.json signature a records file was built against; raises ValueError if damaged"""
+    with open(path, 'rb') as f:
+        return _read_trailer(f)[2]
+
+
+def retarget(path: Path, source_path: Path) -> None:
+    """Mark a records file as built against ``source_path`` as it is now.
+
+    For a users.json written from the records file itself (see
+    ``write_users_document``); only the trailer is rewritten.
+    """
+    with open(path, 'r+b') as f:
+        index_offset, index_length, _ = _read_trailer(f)
+        f.seek(-_TRAILER.size, os.SEEK_END)
+        f.write(_TRAILER.pack(MAGIC, index_offset, index_length, FORMAT_VERSION, *_signature(source_path)))
+
+
+def write_users_document(path: Path, dest) -> None:
+    """Write the ``{"users": [...]}`` document a records file holds to the binary file ``dest``"""
+    with open(path, 'rb') as f:
+        index_offset, _, _ = _read_trailer(f)
+        f.seek(0)
+        dest.write(b'{"users":[')
+        # Records are compact JSON, so a newline byte only ever ends a record
+        remaining = index_offset - 1
+        while remaining > 0:
+            chunk = f.read(min(_CHUNK, remaining))
+            if not chunk:
+                raise ValueError('records file is truncated')
+            dest.write(chunk.replace(b'\n', b','))
+            remaining -= len(chunk)
+        dest.write(b']}')
+
+
+def write_records(path: Path, users, source_signature) -> None:
+    """Write the records file for ``users`` atomically"""
+    ids = []
+    usernames = {}
+    emails = {}
+    offset = 0
+    tmp_path = path.with_name(f'{path.name}.{os.getpid()}.{threading.get_ident()}.tmp')
+    try:
+        with open(tmp_path, 'wb') as f:
+            for user in users:
+                line = _encode(user)
+                span = [offset, len(line)]
+                ids.append([user['id']] + span)
+                usernames[user['username']] = span
+                if user.get('email'):
+                    emails[user['email']] = span
+                f.write(line)
+                f.write(b'\n')
+                offset += len(line) + 1
+
+            index = json.dumps({
+                'ids': ids,
+                'usernames': usernames,
+                'emails': emails,
+            }, separators=(',', ':')).encode('utf-8')
+            f.write(index)
+            f.write(_TRAILER.pack(MAGIC, offset, len(index), FORMAT_VERSION, *source_signature))
+        os.replace(tmp_path, path)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+
+class _Mapping:
+    """An open records file and its decoded index"""
+
+    def __init__(self, key, mm, index, source):
+        self.key = key
+        self.mm = mm
+        self.source = source
+        self.spans = [(off, length) for _, off, length in index['ids']]
+        self.by_id = {user_id: (off, length) for user_id, off, length in index['ids']}
+        self.by_username = index['usernames']
+        self.by_email = index['emails']
+
+    def read(self, span):
+        off, length = span
+        return json.loads(self.mm[off:off + length])
+
+
+class RecordStore:
+    """mmap-backed single-record reader kept in sync with the JSON database.
+
+    ``get_db_path`` returns the current ``users.json`` path and ``load_users``
+    returns its normalized user list; both are callables so the store follows
+    ``manage.db.DB_PATH`` if it is swapped at runtime. ``try_lock`` is a
+    context manager that takes the database write lock without waiting and
+    yields whether it got it.
+    """
+
+    def __init__(self, get_db_path, load_users, try_lock=None):
+        self._get_db_path = get_db_path
+        self._load_users = load_users
+        self._try_lock = try_lock or (lambda: nullcontext(True))
+        self._lock = threading.Lock()
+        self._mapping = None
+
+    def rebuild(self, users=None) -> None:
+        """Regenerate the sidecar from ``users`` (or from users.json)"""
+        db_path = self._get_db_path()
+        signature = _signature(db_path)
+        if users is None:
+            users = self._load_users()
+        write_records(records_path(db_path), users, signature)
+
+    def fresh_path(self):
+        """Path of a records file matching users.json, rebuilt first if it is stale.
+
+        Callers must hold the database write lock so the file stays current.
+        """
+        db_path = self._get_db_path()
+        path = records_path(db_path)
+        try:
+            if source_of(path) == _signature(db_path):
+                return path
+        except (OSError, ValueError):
+            pass
+        self.rebuild()
+        return path
+
+    def _current(self, path):
+        """The mapping of the records file on disk, whichever users.json it was built from"""
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return None
+        key = (str(path), st.st_ino, st.st_mtime_ns, st.st_size)
+        mapping = self._mapping
+        if mapping is None or mapping.key != key:
+            with self._lock:
+                mapping = self._mapping
+                if mapping is None or mapping.key != key:
+                    try:
+                        mapping = self._map(path, key)
+                    except (OSError, ValueError):
+                        # Damaged or half-written; treated like a missing file so it gets rebuilt
+                        return None
+                    self._mapping = mapping
+        return mapping
+
+    def _open(self):
+        db_path = self._get_db_path()
+        path = records_path(db_path)
+        mapping = self._current(path)
+        if mapping is not None and mapping.source == _signature(db_path):
+            return mapping
+
+        with self._try_lock() as locked:
+            if locked:
+                # Only one reader gets here; re-check in case a writer just finished
+                mapping = self._current(path)
+                if mapping is None or mapping.source != _signature(db_path):
+                    self.rebuild()
+                    mapping = self._current(path)
+                if mapping is not None and mapping.source == _signature(db_path):
+                    return mapping
+                raise ValueError('records file is out of date')
+
+        if mapping is not None:
+            # A write (or another reader's rebuild) is in progress and will regenerate
+            # the file; until then serve the state from just before it
+            return mapping
+        raise ValueError('records file is missing')
+
+    @staticmethod
+    def _map(path, key):
+        """Map a records file; raises ValueError if it is empty, truncated or corrupt"""
+        with open(path, 'rb') as f:
+            # Mapped read-only; the mapping outlives the file handle and stays
+            # valid after the file is atomically replaced by a newer version.
+            # An empty file cannot be mapped and raises ValueError.
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            index_offset, index_length, source = _unpack_trailer(mm[-_TRAILER.size:], len(mm))
+            index = _decode(mm[index_offset:index_offset + index_length])
+            return _Mapping(key, mm, index, source)
+        except (struct.error, KeyError, TypeError, ValueError) as e:
+            mm.close()
+            raise ValueError(f'unreadable records file: {e}') from e
+
+    def get_by_id(self, user_id):
+        mapping = self._open()
+        span = mapping.by_id.get(user_id)
+        return mapping.read(span) if span else None
+
+    def get_by_username(self, username):
+        mapping = self._open()
+        span = mapping.by_username.get(username)
+        return mapping.read(span) if span else None
+
+    def get_by_email(self, email):
+        mapping = self._open()
+        span = mapping.by_email.get(email)
+        return mapping.read(span) if span else None
+
+    def page(self, offset, limit):
+        """Records ``offset`` to ``offset + limit`` in list order, plus the total"""
+        mapping = self._open()
+        spans = mapping.spans[offset:offset + limit]
+        return [mapping.read(span) for span in spans], len(mapping.spans)
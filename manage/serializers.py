@@ -0,0 +1,100 @@
+"""Codecs for reading and writing users.json.
+
+Every codec reads and writes bytes, and every codec writes plain JSON, so any
+of them can load a file written by any other; switching codecs needs no
+migration. ``get_codec('auto')`` picks orjson when it is installed and falls
+back to the stdlib compact encoder otherwise.
+
+- ``json-indent``: ``indent=2``, the original layout; readable diffs, slowest.
+- ``json``: stdlib, no whitespace.
+- ``json-stream``: same bytes as ``json``, but encoded and written one list
+  item at a time, so saving never holds the whole document as one string.
+- ``orjson``: optional C/Rust encoder and decoder.
+"""
+import json
+
+try:
+    import orjson
+except ImportError:  # optional speedup
+    orjson = None
+
+_COMPACT = {'separators': (',', ':')}
+
+
+class IndentedJSONCodec:
+    name = 'json-indent'
+
+    def dumps(self, data):
+        return json.dumps(data, indent=2).encode('utf-8')
+
+    def dump(self, data, f):
+        f.write(self.dumps(data))
+
+    def loads(self, raw):
+        return json.loads(raw)
+
+    def load(self, f):
+        return self.loads(f.read())
+
+
+class CompactJSONCodec(IndentedJSONCodec):
+    name = 'json'
+
+    def dumps(self, data):
+        return json.dumps(data, **_COMPACT).encode('utf-8')
+
+
+class StreamingJSONCodec(CompactJSONCodec):
+    """Byte-for-byte the ``json`` layout, written one top-level list item at a time"""
+    name = 'json-stream'
+
+    def dumps(self, data):
+        return b''.join(self._chunks(data))
+
+    def dump(self, data, f):
+        for chunk in self._chunks(data):
+            f.write(chunk)
+
+    @staticmethod
+    def _chunks(data):
+        if not isinstance(data, dict):
+            yield json.dumps(data, **_COMPACT).encode('utf-8')
+            return
+        yield b'{'
+        for n, (key, value) in enumerate(data.items()):
+            yield (b',' if n else b'') + json.dumps(str(key)).encode('utf-8') + b':'
+            if isinstance(value, list):
+                yield b'['
+                for i, item in enumerate(value):
+                    yield (b',' if i else b'') + json.dumps(item, **_COMPACT).encode('utf-8')
+                yield b']'
+            else:
+                yield json.dumps(value, **_COMPACT).encode('utf-8')
+        yield b'}'
+
+
+class OrjsonCodec(IndentedJSONCodec):
+    name = 'orjson'
+
+    def dumps(self, data):
+        return orjson.dumps(data)
+
+    def loads(self, raw):
+        return orjson.loads(raw)
+
+
+CODECS = {
+    codec.name: codec
+    for codec in (IndentedJSONCodec(), CompactJSONCodec(), StreamingJSONCodec(), OrjsonCodec())
+    if codec.name != 'orjson' or orjson is not None
+}
+
+
+def get_codec(name='auto'):
+    """Look up a codec by name; ``auto`` prefers orjson, then ``json``"""
+    if name == 'auto':
+        return CODECS.get('orjson') or CODECS['json']
+    try:
+        return CODECS[name]
+    except KeyError:
+        raise ValueError(f"Unknown users.json codec {name!r}; available: auto, {', '.join(CODECS)}") from None
@@ -0,0 +1,207 @@
+"""Point-in-time snapshots of the user database.
+
+Saves never modify files in place: they write a new file and rename it over
+the old one. A snapshot therefore only has to pin the current file while
+holding the write lock (a hardlink, or a copy where links are unsupported)
+and can compress it after the lock is released, while readers and writers
+carry on against newer files.
+
+The file pinned is the record store (``users.json.records``), which holds
+every user and the lookup index, so a restore can install it as is and write
+users.json out of it without re-encoding anything. A JSON metadata block
+(the credential index) and its length as 8 bytes follow it inside the
+snapshot.
+
+Snapshots are gzip (level 1) files in ``users.json.snapshots/``, named
+``<UTC time>-seq<change seq>[-<label>].records.gz``; the name is the snapshot
+id. Only the newest ``keep`` are retained.
+"""
+import gzip
+import json
+import os
+import re
+import shutil
+import struct
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+try:
+    import orjson
+except ImportError:  # optional speedup
+    orjson = None
+
+SUFFIX = '.records.gz'
+# Pinned or half-written files older than this were left by a crashed process
+STALE_SECONDS = 3600
+_ID = re.compile(r'(?P<at>\d{8}T\d{12}Z)-seq(?P<seq>\d+)(?:-(?P<label>[a-z0-9-]+))?')
+_CHUNK = 1 << 20
+_META_LENGTH = struct.Struct('>Q')
+
+
+def snapshots_dir(db_path: Path) -> Path:
+    return db_path.with_name(db_path.name + '.snapshots')
+
+
+def _info(path: Path):
+    if not path.name.endswith(SUFFIX):
+        return None
+    match = _ID.fullmatch(path.name[:-len(SUFFIX)])
+    if not match:
+        return None
+    return {
+        'id': match.group(0),
+        'created_at': datetime.strptime(match['at'], '%Y%m%dT%H%M%S%fZ')
+                              .replace(tzinfo=timezone.utc).isoformat(),
+        'seq': int(match['seq']),
+        'label': match['label'],
+        'bytes': path.stat().st_size,
+    }
+
+
+class PendingSnapshot:
+    """A pinned file and its metadata waiting to be compressed"""
+
+    def __init__(self, snapshot_id, staging_path, meta):
+        self.id = snapshot_id
+        self.staging_path = staging_path
+        self.meta = meta
+
+
+class SnapshotStore:
+    """Create, list, prune and extract snapshots of ``get_db_path()``"""
+
+    def __init__(self, get_db_path, keep=10):
+        self._get_db_path = get_db_path
+        self.keep = keep
+        self._lock = threading.Lock()
+
+    def _dir(self):
+        return snapshots_dir(self._get_db_path())
+
+    def pin(self, seq, source_path, meta, label=None):
+        """Hold on to ``source_path`` as it is now; callers must hold the database write lock.
+
+        ``meta`` must not change afterwards; it is JSON-encoded by ``finish``.
+        """
+        directory = self._dir()
+        directory.mkdir(parents=True, exist_ok=True)
+
+        at = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S%fZ')
+        snapshot_id = f'{at}-seq{seq}' + (f'-{label}' if label else '')
+        staging_path = directory / f'.{snapshot_id}.pending'
+        try:
+            os.link(source_path, staging_path)
+        except OSError:
+            # Different filesystem, or no hardlinks: copy while writers are still held off
+            shutil.copyfile(source_path, staging_path)
+        return PendingSnapshot(snapshot_id, staging_path, meta)
+
+    def finish(self, pending, keep=None):
+        """Compress a pinned snapshot into place, prune old ones and return its info"""
+        path = self._dir() / f'{pending.id}{SUFFIX}'
+        tmp_path = path.with_name(f'.{path.name}.tmp')
+        try:
+            with open(pending.staging_path, 'rb') as src, open(tmp_path, 'wb') as raw:
+                with gzip.GzipFile(filename='users.json.records', mode='wb', compresslevel=1, fileobj=raw) as dst:
+                    shutil.copyfileobj(src, dst, _CHUNK)
+                    meta = json.dumps(pending.meta, separators=(',', ':')).encode('utf-8')
+                    dst.write(meta)
+                    dst.write(_META_LENGTH.pack(len(meta)))
+                raw.flush()
+                os.fsync(raw.fileno())
+            os.replace(tmp_path, path)
+        finally:
+            for leftover in (tmp_path, pending.staging_path):
+                try:
+                    os.unlink(leftover)
+                except FileNotFoundError:
+                    pass
+
+        info = _info(path)
+        self.prune(self.keep if keep is None else keep)
+        return info
+
+    def list(self):
+        """Info for every snapshot, newest first"""
+        try:
+            entries = list(os.scandir(self._dir()))
+        except FileNotFoundError:
+            return []
+        snapshots = []
+        for entry in entries:
+            try:
+                info = _info(Path(entry.path))
+            except FileNotFoundError:
+                continue
+            if info:
+                snapshots.append(info)
+        snapshots.sort(key=lambda s: s['id'], reverse=True)
+        return snapshots
+
+    def prune(self, keep):
+        """Delete all but the newest ``keep`` snapshots, and stale leftovers; returns the deleted ids"""
+        with self._lock:
+            removed = [s['id'] for s in self.list()[max(keep, 1):]]
+            for snapshot_id in removed:
+                try:
+                    os.unlink(self._dir() / f'{snapshot_id}{SUFFIX}')
+                except FileNotFoundError:
+                    pass
+            self._sweep()
+        return removed
+
+    def _sweep(self):
+        cutoff = time.time() - STALE_SECONDS
+        try:
+            entries = list(os.scandir(self._dir()))
+        except FileNotFoundError:
+            return
+        for entry in entries:
+            if not entry.name.startswith('.') or not entry.name.endswith(('.pending', '.tmp')):
+                continue
+            try:
+                if entry.stat().st_mtime < cutoff:
+                    os.unlink(entry.path)
+            except FileNotFoundError:
+                pass
+
+    def get(self, snapshot_id):
+        """Info for one snapshot, or None"""
+        if not isinstance(snapshot_id, str) or not _ID.fullmatch(snapshot_id):
+            return None
+        try:
+            return _info(self._dir() / f'{snapshot_id}{SUFFIX}')
+        except FileNotFoundError:
+            return None
+
+    def extract(self, snapshot_id, dest):
+        """Decompress a snapshot's file into ``dest`` (opened ``w+b``) and return its metadata.
+
+        The gzip CRC is checked. Raises ``OSError``, ``EOFError``, ``zlib.error``
+        or ``ValueError`` for a damaged snapshot.
+        """
+        with gzip.open(self._dir() / f'{snapshot_id}{SUFFIX}', 'rb') as src:
+            shutil.copyfileobj(src, dest, _CHUNK)
+        size = dest.tell()
+        if size < _META_LENGTH.size:
+            raise ValueError('snapshot is truncated')
+        dest.seek(size - _META_LENGTH.size)
+        meta_length, = _META_LENGTH.unpack(dest.read(_META_LENGTH.size))
+        end = size - _META_LENGTH.size - meta_length
+        if end < 0:
+            raise ValueError('snapshot is truncated')
+        dest.seek(end)
+        raw = dest.read(meta_length)
+        meta = orjson.loads(raw) if orjson is not None else json.loads(raw)
+        dest.truncate(end)
+        dest.seek(end)
+        return meta
+
+    def discard(self, pending):
+        """Drop a pinned snapshot that will not be finished"""
+        try:
+            os.unlink(pending.staging_path)
+        except FileNotFoundError:
+            pass
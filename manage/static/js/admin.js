@@ -12,14 +12,24 @@ const payrollUserCount = document.getElementById('payrollUserCount');
 const payrollUserSelectRow = document.getElementById('payrollUserSelectRow');
 const payrollUserSelect = document.getElementById('payrollUserSelect');
 
+// Users known to this page, kept current by the change feed (/api/changes)
+const userCache = new Map();
+let changeSeq = null;
+let changeFeed = null;
+
+// The server renders the first page of users; the rest is fetched on demand
+const USERS_PAGE_SIZE = 50;
+const USERS_BULK_PAGE_SIZE = 500;
+let usersPage = 0;
+let usersTotal = 0;
+let allUsersLoaded = false;
+
 async function populatePayrollUserSelect() {
     if (!payrollUserSelect) return;
     payrollUserSelect.innerHTML = '<option value="">Select employee...</option>';
 
     try {
-        const response = await fetch('/api/users');
-        const data = await response.json();
-        const users = (data.users || []).filter(u => u.role === 'user');
+        const users = (await getUsers()).filter(u => u.role === 'user');
 
         for (const user of users) {
             const opt = document.createElement('option');
@@ -64,7 +74,7 @@ function getCookie(name) {
 document.addEventListener('DOMContentLoaded', () => {
     console.log('DOM loaded');
     console.log('payrollUsersTableBody:', document.getElementById('payrollUsersTableBody'));
-    loadUsers();
+    initUsersFromPage();
 
     // Prevent “stuck backdrop” if the payroll modal was shown more than once.
     const payrollModalEl = document.getElementById('payrollModal');
@@ -83,12 +93,7 @@ document.addEventListener('DOMContentLoaded', () => {
 // Load payroll users for input section
 window.loadPayrollUsers = async function() {
     try {
-        const response = await fetch('/api/users');
-        const data = await response.json();
-        
-        if (data.users) {
-            renderPayrollUsersTable(data.users);
-        }
+        renderPayrollUsersTable(await getUsers());
     } catch (error) {
         console.error('Failed to load payroll users:', error);
     }
@@ -102,63 +107,108 @@ window.loadAllPayrollHistory = async function() {
     historyBody.innerHTML = '<tr><td colspan="7" class="text-center text-muted">Loading...</td></tr>';
     
     try {
-        const response = await fetch('/api/users');
-        const data = await response.json();
-        
-        if (!data.users) return;
-        
-        historyBody.innerHTML = '';
-        const users = data.users.filter(u => u.role === 'user');
-        
-        for (const user of users) {
-            const history = Array.isArray(user.payroll_history) ? user.payroll_history : [];
-            
-            const row = document.createElement('tr');
-            // Newest payroll is stored at index 0
-            const latest = history.length > 0 ? history[0] : null;
+        renderRows(historyBody, (await getUsers()).filter(u => u.role === 'user'), buildPayrollHistoryRow,
+            '<tr><td colspan="7" class="text-center text-muted">No users found</td></tr>');
+    } catch (error) {
+        historyBody.innerHTML = '<tr><td colspan="7" class="text-center text-danger">Failed to load payroll history</td></tr>';
+    }
+};
 
-            const currentStatus = (latest && latest.status) ? latest.status : 'pending';
-            const statusLabel = currentStatus === 'in_progress' ? 'In Progress' : (currentStatus === 'transferred' ? 'Transferred' : 'Pending');
-            const statusClass = currentStatus === 'transferred' ? 'success' : (currentStatus === 'in_progress' ? 'warning' : 'secondary');
-            const statusDisabled = latest ? '' : 'disabled';
-            
-            row.innerHTML = `
-                <td>
-                    <strong>${user.full_name}</strong><br>
-                    <small class="text-muted">${user.username}</small>
-                </td>
-                <td>${user.department || '-'}</td>
-                <td>${latest ? latest.month : '<span class="text-muted">-</span>'}</td>
-                <td><strong>${latest ? `Rp ${Number(latest.net_salary || 0).toLocaleString('id-ID')}` : '<span class="text-muted">No data</span>'}</strong></td>
-                <td>
-                    <div class="d-flex gap-2 align-items-center">
-                        <select class="form-select form-select-sm" style="max-width: 160px;" ${statusDisabled}
-                            onchange='window.updatePayrollStatus(${user.id}, "${latest ? latest.month : ''}", this.value)'>
-                            <option value="pending" ${currentStatus === 'pending' ? 'selected' : ''}>Pending</option>
-                            <option value="in_progress" ${currentStatus === 'in_progress' ? 'selected' : ''}>In Progress</option>
-                            <option value="transferred" ${currentStatus === 'transferred' ? 'selected' : ''}>Transferred</option>
-                        </select>
-                        <span class="badge bg-${statusClass}">${statusLabel}</span>
-                    </div>
-                </td>
-                <td><span class="badge bg-info">${history.length} ${history.length === 1 ? 'record' : 'records'}</span></td>
-                <td>
-                    <button class="btn btn-sm btn-info" onclick="openPayrollModal(${user.id})" title="View Details">
-                        <i class="fas fa-eye"></i>
-                    </button>
-                    ${latest ? `<a class="btn btn-sm btn-success" href="/api/payroll/${user.id}/pdf?month=${latest.month}" target="_blank" title="Download Latest PDF">
-                        <i class="fas fa-file-pdf"></i>
-                    </a>` : ''}
-                </td>
-            `;
-            historyBody.appendChild(row);
+// List summaries carry latest_payroll/payroll_count; change-feed users the full history
+function latestPayroll(user) {
+    if (user.latest_payroll !== undefined) return user.latest_payroll;
+    // Newest payroll is stored at index 0
+    return Array.isArray(user.payroll_history) && user.payroll_history.length > 0 ? user.payroll_history[0] : null;
+}
+
+function payrollCount(user) {
+    if (user.payroll_count !== undefined) return user.payroll_count;
+    return Array.isArray(user.payroll_history) ? user.payroll_history.length : 0;
+}
+
+function buildPayrollHistoryRow(user) {
+    const row = document.createElement('tr');
+    row.dataset.userId = user.id;
+    const latest = latestPayroll(user);
+    const count = payrollCount(user);
+
+    const currentStatus = (latest && latest.status) ? latest.status : 'pending';
+    const statusLabel = currentStatus === 'in_progress' ? 'In Progress' : (currentStatus === 'transferred' ? 'Transferred' : 'Pending');
+    const statusClass = currentStatus === 'transferred' ? 'success' : (currentStatus === 'in_progress' ? 'warning' : 'secondary');
+    const statusDisabled = latest ? '' : 'disabled';
+    
+    row.innerHTML = `
+        <td>
+            <strong>${user.full_name}</strong><br>
+            <small class="text-muted">${user.username}</small>
+        </td>
+        <td>${user.department || '-'}</td>
+        <td>${latest ? latest.month : '<span class="text-muted">-</span>'}</td>
+        <td><strong>${latest ? `Rp ${Number(latest.net_salary || 0).toLocaleString('id-ID')}` : '<span class="text-muted">No data</span>'}</strong></td>
+        <td>
+            <div class="d-flex gap-2 align-items-center">
+                <select class="form-select form-select-sm" style="max-width: 160px;" ${statusDisabled}
+                    onchange='window.updatePayrollStatus(${user.id}, "${latest ? latest.month : ''}", this.value)'>
+                    <option value="pending" ${currentStatus === 'pending' ? 'selected' : ''}>Pending</option>
+                    <option value="in_progress" ${currentStatus === 'in_progress' ? 'selected' : ''}>In Progress</option>
+                    <option value="transferred" ${currentStatus === 'transferred' ? 'selected' : ''}>Transferred</option>
+                </select>
+                <span class="badge bg-${statusClass}">${statusLabel}</span>
+            </div>
+        </td>
+        <td><span class="badge bg-info">${count} ${count === 1 ? 'record' : 'records'}</span></td>
+        <td>
+            <button class="btn btn-sm btn-info" onclick="openPayrollModal(${user.id})" title="View Details">
+                <i class="fas fa-eye"></i>
+            </button>
+            ${latest ? `<a class="btn btn-sm btn-success" href="/api/payroll/${user.id}/pdf?month=${latest.month}" target="_blank" title="Download Latest PDF">
+                <i class="fas fa-file-pdf"></i>
+            </a>` : ''}
+        </td>
+    `;
+    return row;
+}
+
+// Open a payroll month for every active employee (dry run first, then confirm)
+window.openPayrollMonth = async function() {
+    const next = new Date();
+    next.setMonth(next.getMonth() + 1);
+    const suggested = `${next.getFullYear()}-${String(next.getMonth() + 1).padStart(2, '0')}`;
+    const month = (prompt('Open payroll month (YYYY-MM):', suggested) || '').trim();
+    if (!month) return;
+
+    const post = async (dryRun) => {
+        const response = await fetch('/api/payroll/open-month', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'X-CSRFToken': getCookie('csrftoken')
+            },
+            body: JSON.stringify({ month, dry_run: dryRun })
+        });
+        return response.json();
+    };
+
+    try {
+        const preview = await post(true);
+        if (!preview.success) {
+            showError(preview.error || 'Failed to open payroll month');
+            return;
         }
-        
-        if (users.length === 0) {
-            historyBody.innerHTML = '<tr><td colspan="7" class="text-center text-muted">No users found</td></tr>';
+        if (preview.created === 0) {
+            showSuccess(`Nothing to open for ${month} (${preview.skipped_existing} already exist, ${preview.skipped_no_history} without earlier payroll)`);
+            return;
+        }
+        if (!confirm(`Create ${preview.created} pending payroll record(s) for ${month}?`)) return;
+
+        const result = await post(false);
+        if (result.success) {
+            showSuccess(`Opened ${month}: ${result.created} record(s) created in ${result.elapsed_ms} ms`);
+        } else {
+            showError(result.error || 'Failed to open payroll month');
         }
     } catch (error) {
-        historyBody.innerHTML = '<tr><td colspan="7" class="text-center text-danger">Failed to load payroll history</td></tr>';
+        showError('Failed to open payroll month: ' + error.message);
     }
 };
 
@@ -207,9 +257,7 @@ window.updatePayrollStatus = async function(userId, month, status) {
         }
 
         showSuccess('Payroll status updated');
-        if (typeof window.loadPayrollUsers === 'function') window.loadPayrollUsers();
-        if (typeof window.loadAllPayrollHistory === 'function') window.loadAllPayrollHistory();
-        if (typeof window.loadPDFGenerationList === 'function') window.loadPDFGenerationList();
+        syncAfterMutation();
     } catch (error) {
         showError('Failed to update payroll status: ' + error.message);
     }
@@ -223,55 +271,48 @@ window.loadPDFGenerationList = async function() {
     pdfBody.innerHTML = '<tr><td colspan="5" class="text-center text-muted">Loading...</td></tr>';
     
     try {
-        const response = await fetch('/api/users');
-        const data = await response.json();
-        
-        if (!data.users) return;
-        
-        pdfBody.innerHTML = '';
-        const users = data.users.filter(u => u.role === 'user');
-        
-        for (const user of users) {
-            const history = Array.isArray(user.payroll_history) ? user.payroll_history : [];
-            
-            const row = document.createElement('tr');
-            const latest = history.length > 0 ? history[0] : null;
-
-            const currentStatus = (latest && latest.status) ? latest.status : 'pending';
-            const statusLabel = currentStatus === 'in_progress' ? 'In Progress' : (currentStatus === 'transferred' ? 'Transferred' : 'Pending');
-            const statusClass = currentStatus === 'transferred' ? 'success' : (currentStatus === 'in_progress' ? 'warning' : 'secondary');
-            const statusDisabled = latest ? '' : 'disabled';
-            
-            row.innerHTML = `
-                <td><strong>${user.full_name}</strong><br><small class="text-muted">${user.username}</small></td>
-                <td>${latest ? latest.month : 'No data'}</td>
-                <td>${latest ? `Rp ${Number(latest.net_salary || 0).toLocaleString()}` : '-'}</td>
-                <td>
-                    <div class="d-flex gap-2 align-items-center">
-                        <select class="form-select form-select-sm" style="max-width: 160px;" ${statusDisabled}
-                            onchange='window.updatePayrollStatus(${user.id}, "${latest ? latest.month : ''}", this.value)'>
-                            <option value="pending" ${currentStatus === 'pending' ? 'selected' : ''}>Pending</option>
-                            <option value="in_progress" ${currentStatus === 'in_progress' ? 'selected' : ''}>In Progress</option>
-                            <option value="transferred" ${currentStatus === 'transferred' ? 'selected' : ''}>Transferred</option>
-                        </select>
-                        <span class="badge bg-${statusClass}">${statusLabel}</span>
-                    </div>
-                </td>
-                <td>
-                    ${latest ? `
-                        <a class="btn btn-sm btn-primary" href="/api/payroll/${user.id}/pdf?month=${latest.month}" target="_blank">
-                            <i class="fas fa-file-pdf"></i> Generate PDF
-                        </a>
-                    ` : '<span class="text-muted">No payroll data</span>'}
-                </td>
-            `;
-            pdfBody.appendChild(row);
-        }
+        renderRows(pdfBody, (await getUsers()).filter(u => u.role === 'user'), buildPdfRow, '');
     } catch (error) {
         pdfBody.innerHTML = '<tr><td colspan="5" class="text-center text-danger">Failed to load PDF generation list</td></tr>';
     }
 };
 
+function buildPdfRow(user) {
+    const row = document.createElement('tr');
+    row.dataset.userId = user.id;
+    const latest = latestPayroll(user);
+
+    const currentStatus = (latest && latest.status) ? latest.status : 'pending';
+    const statusLabel = currentStatus === 'in_progress' ? 'In Progress' : (currentStatus === 'transferred' ? 'Transferred' : 'Pending');
+    const statusClass = currentStatus === 'transferred' ? 'success' : (currentStatus === 'in_progress' ? 'warning' : 'secondary');
+    const statusDisabled = latest ? '' : 'disabled';
+    
+    row.innerHTML = `
+        <td><strong>${user.full_name}</strong><br><small class="text-muted">${user.username}</small></td>
+        <td>${latest ? latest.month : 'No data'}</td>
+        <td>${latest ? `Rp ${Number(latest.net_salary || 0).toLocaleString()}` : '-'}</td>
+        <td>
+            <div class="d-flex gap-2 align-items-center">
+                <select class="form-select form-select-sm" style="max-width: 160px;" ${statusDisabled}
+                    onchange='window.updatePayrollStatus(${user.id}, "${latest ? latest.month : ''}", this.value)'>
+                    <option value="pending" ${currentStatus === 'pending' ? 'selected' : ''}>Pending</option>
+                    <option value="in_progress" ${currentStatus === 'in_progress' ? 'selected' : ''}>In Progress</option>
+                    <option value="transferred" ${currentStatus === 'transferred' ? 'selected' : ''}>Transferred</option>
+                </select>
+                <span class="badge bg-${statusClass}">${statusLabel}</span>
+            </div>
+        </td>
+        <td>
+            ${latest ? `
+                <a class="btn btn-sm btn-primary" href="/api/payroll/${user.id}/pdf?month=${latest.month}" target="_blank">
+                    <i class="fas fa-file-pdf"></i> Generate PDF
+                </a>
+            ` : '<span class="text-muted">No payroll data</span>'}
+        </td>
+    `;
+    return row;
+}
+
 if (payrollForm) {
     payrollForm.addEventListener('submit', async (e) => {
         window.__payrollFormBound = true;
@@ -304,17 +345,7 @@ if (payrollForm) {
             if (data.success) {
                 showSuccess('Payroll updated successfully!');
                 await loadPayrollHistory(userId);
-                // Refresh input table to show updated dates
-                if (typeof window.loadPayrollUsers === 'function') {
-                    window.loadPayrollUsers();
-                }
-                // Refresh history view if it's currently visible
-                const historySection = document.getElementById('payrollHistorySection');
-                if (historySection && historySection.style.display !== 'none') {
-                    if (typeof window.loadAllPayrollHistory === 'function') {
-                        window.loadAllPayrollHistory();
-                    }
-                }
+                syncAfterMutation();
                 payrollForm.reset();
             } else {
                 showError(data.error || 'Failed to save payroll');
@@ -362,17 +393,7 @@ addUserForm.addEventListener('submit', async (e) => {
                 const modal = bootstrap.Modal.getInstance(modalEl) || new bootstrap.Modal(modalEl);
                 modal.hide();
             }
-            loadUsers();
-            // Always refresh payroll tables so they're updated when viewed
-            if (typeof window.loadPayrollUsers === 'function') {
-                window.loadPayrollUsers();
-            }
-            if (typeof window.loadAllPayrollHistory === 'function') {
-                window.loadAllPayrollHistory();
-            }
-            if (typeof window.loadPDFGenerationList === 'function') {
-                window.loadPDFGenerationList();
-            }
+            syncAfterMutation();
         } else {
             showError(data.error || 'Failed to create user');
         }
@@ -420,17 +441,7 @@ editUserForm.addEventListener('submit', async (e) => {
                 editUserForm.reset();
                 const modal = bootstrap.Modal.getInstance(document.getElementById('editUserModal'));
                 modal.hide();
-                loadUsers();
-                // Always refresh payroll tables
-                if (typeof window.loadPayrollUsers === 'function') {
-                    window.loadPayrollUsers();
-                }
-                if (typeof window.loadAllPayrollHistory === 'function') {
-                    window.loadAllPayrollHistory();
-                }
-                if (typeof window.loadPDFGenerationList === 'function') {
-                    window.loadPDFGenerationList();
-                }
+                syncAfterMutation();
             }
         } else {
             showError(data.error || 'Failed to update user');
@@ -461,17 +472,7 @@ async function uploadProfilePicture(userId, file) {
             editUserForm.reset();
             const modal = bootstrap.Modal.getInstance(document.getElementById('editUserModal'));
             modal.hide();
-            loadUsers();
-            // Always refresh payroll tables
-            if (typeof window.loadPayrollUsers === 'function') {
-                window.loadPayrollUsers();
-            }
-            if (typeof window.loadAllPayrollHistory === 'function') {
-                window.loadAllPayrollHistory();
-            }
-            if (typeof window.loadPDFGenerationList === 'function') {
-                window.loadPDFGenerationList();
-            }
+            syncAfterMutation();
         } else {
             showError(data.error || 'Failed to upload profile picture');
         }
@@ -480,70 +481,274 @@ async function uploadProfilePicture(userId, file) {
     }
 }
 
-// Load all users
+// Start from the first page the server embedded in the page
+function initUsersFromPage() {
+    const seed = document.getElementById('usersFirstPage');
+    if (!seed) {
+        loadUsers();
+        return;
+    }
+    const data = JSON.parse(seed.textContent);
+    data.users.forEach(user => userCache.set(user.id, user));
+    changeSeq = data.last_seq ?? 0;
+    usersPage = data.page;
+    usersTotal = data.total;
+    allUsersLoaded = !data.has_more;
+    updateUsersPager();
+    startChangeFeed();
+}
+
+async function fetchUsersPage(page, pageSize) {
+    const response = await fetch(`/api/users?page=${page}&page_size=${pageSize}`);
+    const data = await response.json();
+    if (!response.ok) throw new Error(data.error || response.statusText);
+    return data;
+}
+
+function updateUsersPager() {
+    userCount.textContent = usersTotal;
+    const loadMore = document.getElementById('usersLoadMore');
+    if (loadMore) {
+        loadMore.style.display = usersTableBody.querySelectorAll('tr[data-user-id]').length < usersTotal ? '' : 'none';
+    }
+}
+
+// Append the next page to the users table
+window.loadMoreUsers = async function () {
+    try {
+        const data = await fetchUsersPage(usersPage + 1, USERS_PAGE_SIZE);
+        usersPage = data.page;
+        usersTotal = data.total;
+        data.users.forEach(user => {
+            userCache.set(user.id, user);
+            patchRow(usersTableBody, user.id, user, buildUserRow);
+        });
+        if (!data.has_more) allUsersLoaded = true;
+        updateUsersPager();
+    } catch (error) {
+        showError('Failed to load users: ' + error.message);
+    }
+};
+
+// Load all users, a bulk page at a time
 async function loadUsers() {
     try {
-        const response = await fetch('/api/users');
-        const data = await response.json();
-        
-        if (data.users) {
-            renderUsersTable(data.users);
-            userCount.textContent = data.users.length;
-            renderPayrollUsersTable(data.users);
+        let pages = [];
+        // A write between pages can shift offsets; start over if the version moved
+        for (let attempt = 0; attempt < 3; attempt++) {
+            pages = [await fetchUsersPage(1, USERS_BULK_PAGE_SIZE)];
+            while (pages[pages.length - 1].has_more) {
+                pages.push(await fetchUsersPage(pages.length + 1, USERS_BULK_PAGE_SIZE));
+            }
+            if (pages.every(p => p.last_seq === pages[0].last_seq)) break;
         }
+
+        userCache.clear();
+        pages.forEach(p => p.users.forEach(user => userCache.set(user.id, user)));
+        changeSeq = pages[0].last_seq ?? 0;
+        usersTotal = pages[pages.length - 1].total;
+        allUsersLoaded = true;
+        usersPage = Math.ceil(usersTotal / USERS_PAGE_SIZE);
+
+        const users = cachedUsers();
+        renderUsersTable(users);
+        updateUsersPager();
+        renderPayrollUsersTable(users);
+        refreshVisibleLists();
+        startChangeFeed();
     } catch (error) {
         showError('Failed to load users: ' + error.message);
     }
 }
 
+function cachedUsers() {
+    return Array.from(userCache.values()).sort((a, b) => a.id - b.id);
+}
+
+// Cached users, fetching the rest of them once if the page has only some
+async function getUsers() {
+    if (!allUsersLoaded) {
+        await loadUsers();
+    }
+    return cachedUsers();
+}
+
+// Our own writes come back through the change feed; only refetch without one
+function syncAfterMutation() {
+    if (!changeFeed) loadUsers();
+}
+
+// Streams and long polls hold a server worker open, which only the ASGI server can afford
+const liveChanges = document.body.dataset.liveChanges === '1';
+const CHANGE_POLL_MS = 5000;
+
+function startChangeFeed() {
+    if (changeFeed || changeSeq === null) return;
+
+    if (liveChanges && window.EventSource) {
+        // EventSource reconnects by itself and resumes from Last-Event-ID
+        const source = new EventSource(`/api/changes?stream=1&since=${changeSeq}`);
+        source.addEventListener('change', (e) => applyChange(JSON.parse(e.data)));
+        source.addEventListener('reset', () => {
+            stopChangeFeed();
+            loadUsers();
+        });
+        changeFeed = source;
+    } else {
+        changeFeed = 'poll';
+        pollChanges();
+    }
+}
+
+function stopChangeFeed() {
+    if (changeFeed && changeFeed !== 'poll') changeFeed.close();
+    changeFeed = null;
+}
+
+async function pollChanges() {
+    while (changeFeed === 'poll') {
+        try {
+            const response = await fetch(`/api/changes?since=${changeSeq}` + (liveChanges ? '&wait=25' : ''));
+            const data = await response.json();
+            if (data.reset) {
+                stopChangeFeed();
+                await loadUsers();
+                return;
+            }
+            (data.changes || []).forEach(applyChange);
+        } catch (error) {
+            await new Promise(resolve => setTimeout(resolve, 2000));
+            continue;
+        }
+        if (!liveChanges) {
+            await new Promise(resolve => setTimeout(resolve, CHANGE_POLL_MS));
+        }
+    }
+}
+
+// Apply one change-feed entry to the cache and patch the affected rows
+function applyChange(change) {
+    if (changeSeq !== null && change.seq <= changeSeq) return;
+    changeSeq = change.seq;
+
+    if (change.op === 'user.deleted') {
+        userCache.delete(change.user_id);
+        usersTotal = Math.max(usersTotal - 1, 0);
+        patchUserRows(change.user_id, null);
+    } else if (change.user) {
+        if (change.op === 'user.created' && !userCache.has(change.user_id)) usersTotal++;
+        userCache.set(change.user_id, change.user);
+        patchUserRows(change.user_id, change.user);
+    } else {
+        // Batch operations don't carry rows; refetch once
+        loadUsers();
+    }
+}
+
+function patchUserRows(userId, user) {
+    const employee = user && user.role === 'user' ? user : null;
+    patchRow(usersTableBody, userId, user, buildUserRow);
+    patchRow(payrollUsersTableBody, userId, employee, buildPayrollUserRow);
+    patchRow(document.getElementById('payrollHistoryTableBody'), userId, employee, buildPayrollHistoryRow);
+    patchRow(document.getElementById('generatePDFTableBody'), userId, employee, buildPdfRow);
+
+    const users = cachedUsers();
+    updateUsersPager();
+    if (payrollUserCount && allUsersLoaded) {
+        payrollUserCount.textContent = users.filter(u => u.role === 'user').length;
+    }
+    const directoryCard = document.getElementById('directoryCard');
+    if (directoryCard && directoryCard.style.display !== 'none') {
+        directoryData = users;
+        searchDirectory();
+    }
+}
+
+// Replace, append or remove the row for one user in an already rendered table
+function patchRow(tbody, userId, user, buildRow) {
+    if (!tbody || tbody.dataset.rendered !== '1') return;
+    const existing = tbody.querySelector(`tr[data-user-id="${userId}"]`);
+    if (!user) {
+        if (existing) existing.remove();
+        return;
+    }
+    const row = buildRow(user);
+    if (existing) {
+        existing.replaceWith(row);
+    } else {
+        // Drop "No users found" style placeholders
+        tbody.querySelectorAll('tr:not([data-user-id])').forEach(r => r.remove());
+        tbody.appendChild(row);
+    }
+}
+
+function renderRows(tbody, users, buildRow, emptyHtml) {
+    tbody.innerHTML = '';
+    users.forEach(user => tbody.appendChild(buildRow(user)));
+    if (users.length === 0 && emptyHtml) {
+        tbody.innerHTML = emptyHtml;
+    }
+    tbody.dataset.rendered = '1';
+}
+
+// Re-render payroll lists that are on screen from the cache
+function refreshVisibleLists() {
+    const historySection = document.getElementById('payrollHistorySection');
+    if (historySection && historySection.style.display !== 'none') {
+        window.loadAllPayrollHistory();
+    }
+    const pdfSection = document.getElementById('generatePDFSection');
+    if (pdfSection && pdfSection.style.display !== 'none') {
+        window.loadPDFGenerationList();
+    }
+}
+
 // Render users in table
 function renderUsersTable(users) {
-    usersTableBody.innerHTML = '';
+    renderRows(usersTableBody, users, buildUserRow, '');
+}
+
+function buildUserRow(user) {
+    const row = document.createElement('tr');
+    row.dataset.userId = user.id;
+    const statusBadge = user.is_active 
+        ? '<span class="badge bg-success">Active</span>' 
+        : '<span class="badge bg-danger">Inactive</span>';
+    const roleBadge = user.role === 'admin' 
+        ? '<span class="badge badge-admin" style="background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);">Admin</span>' 
+        : '<span class="badge badge-user">User</span>';
     
-    users.forEach(user => {
-        const row = document.createElement('tr');
-        const statusBadge = user.is_active 
-            ? '<span class="badge bg-success">Active</span>' 
-            : '<span class="badge bg-danger">Inactive</span>';
-        const roleBadge = user.role === 'admin' 
-            ? '<span class="badge badge-admin" style="background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);">Admin</span>' 
-            : '<span class="badge badge-user">User</span>';
-        
-        const profilePic = user.profile_picture 
-            ? `<img src="${user.profile_picture}" alt="Profile" style="width: 40px; height: 40px; border-radius: 50%; object-fit: cover; display: block; margin: 0 auto;">`
-            : '<i class="fas fa-user-circle" style="font-size: 40px; color: #667eea;"></i>';
-        
-        row.innerHTML = `
-            <td style="text-align: center; vertical-align: middle;">${profilePic}</td>
-            <td>#${user.id}</td>
-            <td>${user.full_name}</td>
-            <td>${user.username}</td>
-            <td>${user.email}</td>
-            <td>${roleBadge}</td>
-            <td>${statusBadge}</td>
-            <td>
-                <button class="btn btn-sm btn-info btn-sm-custom" onclick="editUser(${user.id})">
-                    <i class="fas fa-edit"></i> Edit
-                </button>
-                <button class="btn btn-sm btn-secondary btn-sm-custom" onclick="openPayrollModal(${user.id})">
-                    <i class="fas fa-money-check"></i> Payroll
-                </button>
-                <button class="btn btn-sm btn-danger btn-sm-custom" onclick="deleteUser(${user.id})">
-                    <i class="fas fa-trash"></i> Delete
-                </button>
-            </td>
-        `;
-        
-        usersTableBody.appendChild(row);
-    });
+    const profilePic = user.profile_picture 
+        ? `<img src="${user.profile_picture}" alt="Profile" style="width: 40px; height: 40px; border-radius: 50%; object-fit: cover; display: block; margin: 0 auto;">`
+        : '<i class="fas fa-user-circle" style="font-size: 40px; color: #667eea;"></i>';
+    
+    row.innerHTML = `
+        <td style="text-align: center; vertical-align: middle;">${profilePic}</td>
+        <td>#${user.id}</td>
+        <td>${user.full_name}</td>
+        <td>${user.username}</td>
+        <td>${user.email}</td>
+        <td>${roleBadge}</td>
+        <td>${statusBadge}</td>
+        <td>
+            <button class="btn btn-sm btn-info btn-sm-custom" onclick="editUser(${user.id})">
+                <i class="fas fa-edit"></i> Edit
+            </button>
+            <button class="btn btn-sm btn-secondary btn-sm-custom" onclick="openPayrollModal(${user.id})">
+                <i class="fas fa-money-check"></i> Payroll
+            </button>
+            <button class="btn btn-sm btn-danger btn-sm-custom" onclick="deleteUser(${user.id})">
+                <i class="fas fa-trash"></i> Delete
+            </button>
+        </td>
+    `;
+    return row;
 }
 
 // Edit user
 async function editUser(userId) {
     try {
-        const response = await fetch('/api/users');
-        const data = await response.json();
-        const user = data.users.find(u => u.id === userId);
+        const user = userCache.get(userId) || (await getUsers()).find(u => u.id === userId);
         
         if (user) {
             document.getElementById('editUserId').value = user.id;
@@ -598,17 +803,7 @@ async function deleteUser(userId) {
         
         if (data.success) {
             showSuccess('User deleted successfully!');
-            loadUsers();
-            // Always refresh payroll tables
-            if (typeof window.loadPayrollUsers === 'function') {
-                window.loadPayrollUsers();
-            }
-            if (typeof window.loadAllPayrollHistory === 'function') {
-                window.loadAllPayrollHistory();
-            }
-            if (typeof window.loadPDFGenerationList === 'function') {
-                window.loadPDFGenerationList();
-            }
+            syncAfterMutation();
         } else {
             showError(data.error || 'Failed to delete user');
         }
@@ -651,12 +846,11 @@ if (typeof window.showUserDirectory !== 'function') {
         if (payrollManagement) payrollManagement.style.display = 'none';
         
         // Fetch users and populate directory
-        fetch('/api/users')
-            .then(response => response.json())
-            .then(data => {
-                if (data.users) {
-                    directoryData = data.users;
-                    renderDirectoryTable(data.users);
+        getUsers()
+            .then(users => {
+                if (users) {
+                    directoryData = users;
+                    renderDirectoryTable(users);
                     
                     // Setup search functionality
                     const searchInput = document.getElementById('directorySearch');
@@ -844,57 +1038,55 @@ async function loadPayrollHistory(userId) {
 // Render payroll users table
 function renderPayrollUsersTable(users) {
     if (!payrollUsersTableBody) return;
-    payrollUsersTableBody.innerHTML = '';
 
     const userList = users.filter(u => u.role === 'user');
     if (payrollUserCount) {
         payrollUserCount.textContent = userList.length;
     }
 
-    if (userList.length === 0) {
-        payrollUsersTableBody.innerHTML = '<tr><td colspan="8" class="text-center text-muted">No users found</td></tr>';
-        return;
-    }
+    renderRows(payrollUsersTableBody, userList, buildPayrollUserRow,
+        '<tr><td colspan="8" class="text-center text-muted">No users found</td></tr>');
+}
 
-    userList.forEach(user => {
-        const latest = user.payroll_history && user.payroll_history.length > 0 ? user.payroll_history[0] : null;
-        const lastUpdated = latest && latest.updated_at
-            ? new Date(latest.updated_at).toLocaleDateString('id-ID')
-            : '<span class="text-muted">Never</span>';
+function buildPayrollUserRow(user) {
+    const latest = latestPayroll(user);
+    const lastUpdated = latest && latest.updated_at
+        ? new Date(latest.updated_at).toLocaleDateString('id-ID')
+        : '<span class="text-muted">Never</span>';
 
-        const payrollAmount = latest
-            ? `Rp ${Number(latest.net_salary || 0).toLocaleString('id-ID')}`
-            : '<span class="text-muted">-</span>';
+    const payrollAmount = latest
+        ? `Rp ${Number(latest.net_salary || 0).toLocaleString('id-ID')}`
+        : '<span class="text-muted">-</span>';
 
-        const currentStatus = (latest && latest.status) ? latest.status : 'pending';
-        const statusLabel = currentStatus === 'in_progress' ? 'In Progress' : (currentStatus === 'transferred' ? 'Transferred' : 'Pending');
-        const statusClass = currentStatus === 'transferred' ? 'success' : (currentStatus === 'in_progress' ? 'warning' : 'secondary');
-        const statusDisabled = latest ? '' : 'disabled';
-        
-        const row = document.createElement('tr');
-        row.innerHTML = `
-            <td>#${user.id}</td>
-            <td>${user.full_name}</td>
-            <td>${user.username}</td>
-            <td>${user.department || '-'}</td>
-            <td>${user.position || '-'}</td>
-            <td>${payrollAmount}<br><small class="text-muted">${latest ? latest.month : ''}</small></td>
-            <td>${lastUpdated}</td>
-            <td>
-                <div class="d-flex gap-2 align-items-center">
-                    <select class="form-select form-select-sm" style="max-width: 160px;" ${statusDisabled}
-                        onchange='window.updatePayrollStatus(${user.id}, "${latest ? latest.month : ''}", this.value)'>
-                        <option value="pending" ${currentStatus === 'pending' ? 'selected' : ''}>Pending</option>
-                        <option value="in_progress" ${currentStatus === 'in_progress' ? 'selected' : ''}>In Progress</option>
-                        <option value="transferred" ${currentStatus === 'transferred' ? 'selected' : ''}>Transferred</option>
-                    </select>
-                    <span class="badge bg-${statusClass}">${statusLabel}</span>
-                    <button class="btn btn-sm btn-primary" onclick="openPayrollModal(${user.id})">
-                        <i class="fas fa-edit"></i> Payroll
-                    </button>
-                </div>
-            </td>
-        `;
-        payrollUsersTableBody.appendChild(row);
-    });
-}
\ No newline at end of file
+    const currentStatus = (latest && latest.status) ? latest.status : 'pending';
+    const statusLabel = currentStatus === 'in_progress' ? 'In Progress' : (currentStatus === 'transferred' ? 'Transferred' : 'Pending');
+    const statusClass = currentStatus === 'transferred' ? 'success' : (currentStatus === 'in_progress' ? 'warning' : 'secondary');
+    const statusDisabled = latest ? '' : 'disabled';
+    
+    const row = document.createElement('tr');
+    row.dataset.userId = user.id;
+    row.innerHTML = `
+        <td>#${user.id}</td>
+        <td>${user.full_name}</td>
+        <td>${user.username}</td>
+        <td>${user.department || '-'}</td>
+        <td>${user.position || '-'}</td>
+        <td>${payrollAmount}<br><small class="text-muted">${latest ? latest.month : ''}</small></td>
+        <td>${lastUpdated}</td>
+        <td>
+            <div class="d-flex gap-2 align-items-center">
+                <select class="form-select form-select-sm" style="max-width: 160px;" ${statusDisabled}
+                    onchange='window.updatePayrollStatus(${user.id}, "${latest ? latest.month : ''}", this.value)'>
+                    <option value="pending" ${currentStatus === 'pending' ? 'selected' : ''}>Pending</option>
+                    <option value="in_progress" ${currentStatus === 'in_progress' ? 'selected' : ''}>In Progress</option>
+                    <option value="transferred" ${currentStatus === 'transferred' ? 'selected' : ''}>Transferred</option>
+                </select>
+                <span class="badge bg-${statusClass}">${statusLabel}</span>
+                <button class="btn btn-sm btn-primary" onclick="openPayrollModal(${user.id})">
+                    <i class="fas fa-edit"></i> Payroll
+                </button>
+            </div>
+        </td>
+    `;
+    return row;
+}
@@ -0,0 +1,60 @@
+import io
+
+from django.test import SimpleTestCase
+
+from manage import serializers
+
+
+def _edge_case_data():
+    """Values that tend to break codecs: non-ASCII, line separators, float repr, big ints, nulls"""
+    return {'users': [
+        {
+            'id': 1,
+            'username': 'zoe',
+            'full_name': 'Zoë Ångström 山田',
+            'phone': '+62 812\u20283456',
+            'notes': None,
+            'is_active': True,
+            'payroll_ytd': {'2026': {'gross': 1100000.0, 'months': 1}},
+            'payroll_history': [{
+                'month': '2026-01',
+                'base_salary': 1099999.9,
+                'allowances': 0.1,
+                'deductions': 2 ** 53 + 1,
+                'net_salary': -0.0,
+                'status': 'pending',
+            }],
+        },
+        {'id': 2, 'username': 'empty', 'payroll_history': [], 'tags': [], 'meta': {}},
+    ]}
+
+
+class CodecRoundTripTests(SimpleTestCase):
+    def test_every_codec_reads_every_other_codecs_output(self):
+        data = _edge_case_data()
+        for writer_name, writer in serializers.CODECS.items():
+            buffer = io.BytesIO()
+            writer.dump(data, buffer)
+            raw = buffer.getvalue()
+            for reader_name, reader in serializers.CODECS.items():
+                with self.subTest(writer=writer_name, reader=reader_name):
+                    self.assertEqual(reader.loads(raw), data)
+                    self.assertEqual(reader.load(io.BytesIO(raw)), data)
+
+    def test_dumps_matches_dump(self):
+        data = _edge_case_data()
+        for name, codec in serializers.CODECS.items():
+            with self.subTest(codec=name):
+                buffer = io.BytesIO()
+                codec.dump(data, buffer)
+                self.assertEqual(buffer.getvalue(), codec.dumps(data))
+
+    def test_streaming_codec_writes_the_compact_layout(self):
+        data = _edge_case_data()
+        self.assertEqual(serializers.CODECS['json-stream'].dumps(data), serializers.CODECS['json'].dumps(data))
+
+    def test_get_codec(self):
+        self.assertIn(serializers.get_codec('auto').name, ('orjson', 'json'))
+        self.assertEqual(serializers.get_codec('json-indent').name, 'json-indent')
+        with self.assertRaises(ValueError):
+            serializers.get_codec('yaml')
@@ -1,6 +1,13 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
+# Under ASGI the hot endpoints are served by their async variants
+if settings.ASYNC_VIEWS:
+    from . import async_views as hot_views
+else:
+    hot_views = views
+
 urlpatterns = [
     path('', views.index, name='index'),
     path('login', views.login, name='login'),
@@ -11,13 +18,18 @@ urlpatterns = [
     path('logout', views.logout, name='logout'),
     
     # API endpoints
-    path('api/users', views.api_users, name='api_users'),
-    path('api/users/create', views.api_create_user, name='api_create_user'),
+    path('api/users', hot_views.api_users, name='api_users'),
+    path('api/changes', hot_views.api_changes, name='api_changes'),
+    path('api/users/create', hot_views.api_create_user, name='api_create_user'),
     path('api/users/<int:user_id>/update', views.api_update_user, name='api_update_user'),
     path('api/users/<int:user_id>/delete', views.api_delete_user, name='api_delete_user'),
-    path('api/users/<int:user_id>/upload-picture', views.upload_profile_picture, name='upload_profile_picture'),
-    path('api/payroll/me', views.api_payroll_me, name='api_payroll_me'),
+    path('api/users/<int:user_id>/upload-picture', hot_views.upload_profile_picture, name='upload_profile_picture'),
+    path('api/snapshots', views.api_snapshots, name='api_snapshots'),
+    path('api/snapshots/<str:snapshot_id>/restore', views.api_snapshot_restore, name='api_snapshot_restore'),
+    path('api/payroll/me', hot_views.api_payroll_me, name='api_payroll_me'),
+    path('api/payroll/open-month', views.api_payroll_open_month, name='api_payroll_open_month'),
+    path('api/payroll/adjust', views.api_payroll_adjust, name='api_payroll_adjust'),
     path('api/payroll/<int:user_id>/upsert', views.api_payroll_upsert, name='api_payroll_upsert'),
-    path('api/payroll/<int:user_id>/history', views.api_payroll_user_history, name='api_payroll_user_history'),
-    path('api/payroll/<int:user_id>/pdf', views.api_payroll_pdf, name='api_payroll_pdf'),
+    path('api/payroll/<int:user_id>/history', hot_views.api_payroll_user_history, name='api_payroll_user_history'),
+    path('api/payroll/<int:user_id>/pdf', hot_views.api_payroll_pdf, name='api_payroll_pdf'),
 ]
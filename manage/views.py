@@ -2,10 +2,10 @@ import json
 import secrets
 import os
 import mimetypes
+import time
 from datetime import timedelta
-from io import BytesIO
 from django.shortcuts import render, redirect
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse
 from django.conf import settings
 from django.core.mail import send_mail
 from django.urls import reverse
@@ -13,21 +13,22 @@ from django.utils import timezone
 from django.utils.dateparse import parse_datetime
 from django.views.decorators.http import require_http_methods
 from django.views.decorators.csrf import csrf_exempt, ensure_csrf_cookie
-from manage.db import Database
-from reportlab.lib.pagesizes import A4
-from reportlab.lib import colors
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
+from manage import payroll
+from manage.db import PRIVATE_FIELDS, Database
+from manage.payslip import build_payslip_pdf
 
 def _sanitize_user(user):
     if not user:
         return user
-    safe_user = dict(user)
-    safe_user.pop('password', None)
-    safe_user.pop('verification_token', None)
-    safe_user.pop('verification_sent_at', None)
-    safe_user.pop('verification_expires_at', None)
-    return safe_user
+    return {k: v for k, v in user.items() if k not in PRIVATE_FIELDS}
+
+def _user_summary(user):
+    """Sanitized user without the payroll history, for list views"""
+    summary = {k: v for k, v in _sanitize_user(user).items() if k not in ('payroll_history', 'payroll_ytd')}
+    history = user.get('payroll_history') or []
+    summary['latest_payroll'] = history[0] if history else None
+    summary['payroll_count'] = len(history)
+    return summary
 
 def _parse_money(value):
     if value is None:
@@ -40,6 +41,114 @@ def _parse_money(value):
     except ValueError:
         return 0.0
 
+def _payroll_query(request):
+    """Parse from/to/limit/cursor/year for payroll history endpoints"""
+    params = request.GET
+    query = {}
+    for param, key in (('from', 'from_month'), ('to', 'to_month'), ('cursor', 'cursor')):
+        value = params.get(param)
+        if value:
+            if not payroll.is_valid_month(value):
+                return None, f'{param} must be in YYYY-MM format'
+            query[key] = value
+    try:
+        if params.get('limit'):
+            query['limit'] = int(params['limit'])
+            if query['limit'] < 1:
+                raise ValueError
+        query['year'] = int(params.get('year') or timezone.now().year)
+        if query['year'] < 1:
+            raise ValueError
+    except ValueError:
+        return None, 'limit and year must be positive integers'
+    return query, None
+
+def _payroll_page_response(user_id, query):
+    page, error = Database.get_payroll_page(user_id, **query)
+    if error:
+        return JsonResponse({'error': error}, status=404)
+    return JsonResponse({
+        'payroll_history': page['records'],
+        'next_cursor': page['next_cursor'],
+        'payroll_ytd': page['ytd'],
+    })
+
+USERS_PAGE_SIZE = 50
+USERS_PAGE_SIZE_MAX = 500
+ADMIN_FRAGMENT_TIMEOUT = 600
+
+def _users_page_query(request):
+    """Parse page/page_size for the paged user list; None means the full list"""
+    if 'page' not in request.GET:
+        return None, None
+    try:
+        page = int(request.GET['page'])
+        page_size = int(request.GET.get('page_size') or USERS_PAGE_SIZE)
+        if page < 1 or page_size < 1:
+            raise ValueError
+    except ValueError:
+        return None, 'page and page_size must be positive integers'
+    return {'page': page, 'page_size': min(page_size, USERS_PAGE_SIZE_MAX)}, None
+
+def _users_page(page, page_size, last_seq, users, total):
+    return {
+        'users': [_user_summary(u) for u in users],
+        'total': total,
+        'page': page,
+        'page_size': page_size,
+        'has_more': page * page_size < total,
+        'last_seq': last_seq,
+    }
+
+def _get_users_page(page, page_size):
+    # Read the version first: replaying a change the page already has is harmless
+    last_seq = Database.get_change_seq()
+    users, total = Database.get_users_page((page - 1) * page_size, page_size)
+    return _users_page(page, page_size, last_seq, users, total)
+
+class _FirstUsersPage:
+    """Page 1 of the user list, read the first time a template asks for it"""
+
+    def __init__(self):
+        self._page = None
+
+    # Templates call callables when they resolve them, so this only runs on a fragment cache miss
+    def __call__(self):
+        if self._page is None:
+            self._page = _get_users_page(1, USERS_PAGE_SIZE)
+        return self._page
+
+CHANGE_POLL_INTERVAL = 0.5
+CHANGE_WAIT_MAX = 25
+CHANGE_STREAM_SECONDS = 55
+CHANGE_HEARTBEAT_SECONDS = 15
+
+def _change_feed_params(request):
+    """Parse since/wait/stream for the change feed"""
+    # EventSource resends the last id it saw when it reconnects
+    since = request.headers.get('Last-Event-ID') or request.GET.get('since')
+    try:
+        since = int(since) if since else None
+        wait = min(float(request.GET.get('wait') or 0), CHANGE_WAIT_MAX)
+    except ValueError:
+        return None, 'since and wait must be numbers'
+    if (since is not None and since < 0) or wait < 0:
+        return None, 'since and wait must not be negative'
+    stream = request.GET.get('stream') == '1' or 'text/event-stream' in request.headers.get('Accept', '')
+    return {'since': since, 'wait': wait, 'stream': stream}, None
+
+def _sse_message(event, data, event_id=None):
+    lines = [f'id: {event_id}'] if event_id is not None else []
+    lines.append(f'event: {event}')
+    lines.append(f'data: {json.dumps(data)}')
+    return '\n'.join(lines) + '\n\n'
+
+def _event_stream_response(stream):
+    response = StreamingHttpResponse(stream, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
 def _issue_verification_token(user_id):
     token = secrets.token_urlsafe(32)
     expires_at = timezone.now() + timedelta(hours=24)
@@ -64,6 +173,45 @@ def _send_verification_email(user, request):
     )
     send_mail(subject, message, settings.DEFAULT_FROM_EMAIL, [user['email']])
 
+def _profile_picture_error(file):
+    # Validate file type
+    valid_types = ['image/jpeg', 'image/png', 'image/gif', 'image/webp']
+    if file.content_type not in valid_types:
+        return 'Invalid file type. Only JPEG, PNG, GIF, and WebP allowed.'
+    
+    # Validate file size (max 5MB)
+    if file.size > 5 * 1024 * 1024:
+        return 'File too large. Max 5MB allowed.'
+    return None
+
+UPLOAD_DIR = os.path.join(settings.BASE_DIR, 'manage', 'static', 'img', 'uploads')
+
+def _save_profile_picture(user_id, file):
+    """Write an uploaded picture, swap it in for the old one and return its URL"""
+    # Generate unique filename
+    ext = mimetypes.guess_extension(file.content_type) or '.jpg'
+    filename = f"user_{user_id}_{secrets.token_hex(8)}{ext}"
+    
+    # Save file
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    filepath = os.path.join(UPLOAD_DIR, filename)
+    
+    with open(filepath, 'wb') as f:
+        for chunk in file.chunks():
+            f.write(chunk)
+    
+    # Delete old picture if exists
+    target_user = Database.get_user_by_id(user_id)
+    if target_user and target_user.get('profile_picture'):
+        old_pic = os.path.join(UPLOAD_DIR, os.path.basename(target_user['profile_picture']))
+        if os.path.exists(old_pic):
+            os.remove(old_pic)
+    
+    # Update database
+    pic_url = f"/static/img/uploads/{filename}"
+    Database.update_user(user_id, profile_picture=pic_url)
+    return pic_url
+
 # Home Page
 def index(request):
     return render(request, 'index.html')
@@ -117,8 +265,14 @@ def admin(request):
     if not user or user['role'] != 'admin':
         return redirect('login')
     
-    users = Database.get_all_users()
-    context = {'user': _sanitize_user(user), 'all_users': [ _sanitize_user(u) for u in users ]}
+    # The users card is a cached fragment; the first page is only read on a miss
+    context = {
+        'user': _sanitize_user(user),
+        'dataset_version': Database.get_dataset_version(),
+        'fragment_timeout': ADMIN_FRAGMENT_TIMEOUT,
+        'first_page': _FirstUsersPage(),
+        'live_changes': settings.ASYNC_VIEWS,
+    }
     return render(request, 'admin.html', context)
 
 # API: Get payroll history for current user
@@ -131,11 +285,11 @@ def api_payroll_me(request):
     if not user:
         return JsonResponse({'error': 'Unauthorized'}, status=401)
 
-    history, error = Database.get_payroll_history(user['id'])
+    query, error = _payroll_query(request)
     if error:
-        return JsonResponse({'error': error}, status=404)
+        return JsonResponse({'error': error}, status=400)
 
-    return JsonResponse({'payroll_history': history})
+    return _payroll_page_response(user['id'], query)
 
 # API: Admin upsert payroll record for a user
 @require_http_methods(["POST"])
@@ -151,13 +305,17 @@ def api_payroll_upsert(request, user_id):
     try:
         data = json.loads(request.body)
         month = data.get('month')
-        if not month:
+        if not payroll.is_valid_month(month):
             return JsonResponse({'error': 'Month is required (YYYY-MM)'}, status=400)
 
-        base_salary = _parse_money(data.get('base_salary'))
-        allowances = _parse_money(data.get('allowances'))
-        deductions = _parse_money(data.get('deductions'))
-        net_salary = base_salary + allowances - deductions
+        # Integer cents, so e.g. 1000000 + 100000.1 - 0.2 nets to exactly 1099999.9
+        try:
+            base_salary = payroll.parse_minor(_parse_money(data.get('base_salary')))
+            allowances = payroll.parse_minor(_parse_money(data.get('allowances')))
+            deductions = payroll.parse_minor(_parse_money(data.get('deductions')))
+        except ValueError as e:
+            return JsonResponse({'error': f'Amounts: {e}'}, status=400)
+        net_salary = payroll.net_minor(base_salary, allowances, deductions)
 
         status = (data.get('status') or '').strip().lower()
         if status not in ('pending', 'in_progress', 'transferred', ''):
@@ -165,10 +323,10 @@ def api_payroll_upsert(request, user_id):
 
         record = {
             'month': month,
-            'base_salary': base_salary,
-            'allowances': allowances,
-            'deductions': deductions,
-            'net_salary': net_salary,
+            'base_salary': payroll.from_minor(base_salary),
+            'allowances': payroll.from_minor(allowances),
+            'deductions': payroll.from_minor(deductions),
+            'net_salary': payroll.from_minor(net_salary),
             'notes': data.get('notes', ''),
             'updated_at': timezone.now().isoformat()
         }
@@ -190,6 +348,110 @@ def api_payroll_upsert(request, user_id):
     except Exception as e:
         return JsonResponse({'success': False, 'error': str(e)}, status=400)
 
+# API: Admin opens a payroll month for every active employee
+@require_http_methods(["POST"])
+@csrf_exempt
+def api_payroll_open_month(request):
+    if 'user_id' not in request.session:
+        return JsonResponse({'error': 'Unauthorized'}, status=401)
+
+    admin_user = Database.get_user_by_id(request.session['user_id'])
+    if not admin_user or admin_user['role'] != 'admin':
+        return JsonResponse({'error': 'Forbidden'}, status=403)
+
+    try:
+        data = json.loads(request.body)
+        start = time.perf_counter()
+        report, error = Database.open_payroll_month(data.get('month'), dry_run=bool(data.get('dry_run')))
+        if error:
+            return JsonResponse({'success': False, 'error': error}, status=400)
+
+        report['elapsed_ms'] = round((time.perf_counter() - start) * 1000, 1)
+        return JsonResponse({'success': True, **report})
+    except Exception as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+
+# API: Admin applies bulk adjustment rules to one month's payroll
+@require_http_methods(["POST"])
+@csrf_exempt
+def api_payroll_adjust(request):
+    if 'user_id' not in request.session:
+        return JsonResponse({'error': 'Unauthorized'}, status=401)
+
+    admin_user = Database.get_user_by_id(request.session['user_id'])
+    if not admin_user or admin_user['role'] != 'admin':
+        return JsonResponse({'error': 'Forbidden'}, status=403)
+
+    try:
+        data = json.loads(request.body)
+        user_ids = data.get('user_ids')
+        if user_ids is not None and not (isinstance(user_ids, list) and all(isinstance(i, int) for i in user_ids)):
+            return JsonResponse({'success': False, 'error': 'user_ids must be a list of user IDs'}, status=400)
+
+        start = time.perf_counter()
+        report, error = Database.adjust_payroll(
+            data.get('month'),
+            data.get('rules'),
+            user_ids=user_ids,
+            dry_run=bool(data.get('dry_run')),
+            expected_seq=data.get('expected_seq'),
+        )
+        if error:
+            return JsonResponse({'success': False, 'error': error}, status=400)
+
+        report['elapsed_ms'] = round((time.perf_counter() - start) * 1000, 1)
+        return JsonResponse({'success': True, **report})
+    except Exception as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+
+# API: Admin lists (GET) or takes (POST) snapshots of the database
+@require_http_methods(["GET", "POST"])
+@csrf_exempt
+def api_snapshots(request):
+    if 'user_id' not in request.session:
+        return JsonResponse({'error': 'Unauthorized'}, status=401)
+
+    admin_user = Database.get_user_by_id(request.session['user_id'])
+    if not admin_user or admin_user['role'] != 'admin':
+        return JsonResponse({'error': 'Forbidden'}, status=403)
+
+    if request.method == 'GET':
+        return JsonResponse({'snapshots': Database.list_snapshots()})
+
+    try:
+        start = time.perf_counter()
+        snapshot = Database.snapshot()
+        return JsonResponse({
+            'success': True,
+            'snapshot': snapshot,
+            'elapsed_ms': round((time.perf_counter() - start) * 1000, 1),
+        })
+    except Exception as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=500)
+
+# API: Admin atomically restores the database from a snapshot
+@require_http_methods(["POST"])
+@csrf_exempt
+def api_snapshot_restore(request, snapshot_id):
+    if 'user_id' not in request.session:
+        return JsonResponse({'error': 'Unauthorized'}, status=401)
+
+    admin_user = Database.get_user_by_id(request.session['user_id'])
+    if not admin_user or admin_user['role'] != 'admin':
+        return JsonResponse({'error': 'Forbidden'}, status=403)
+
+    try:
+        data = json.loads(request.body or b'{}')
+        start = time.perf_counter()
+        report, error = Database.restore_snapshot(snapshot_id, backup=data.get('backup', True) is not False)
+        if error:
+            return JsonResponse({'success': False, 'error': error}, status=400)
+
+        report['elapsed_ms'] = round((time.perf_counter() - start) * 1000, 1)
+        return JsonResponse({'success': True, **report})
+    except Exception as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+
 # API: Get payroll history for user (Admin only)
 @require_http_methods(["GET"])
 def api_payroll_user_history(request, user_id):
@@ -200,11 +462,11 @@ def api_payroll_user_history(request, user_id):
     if not admin_user or admin_user['role'] != 'admin':
         return JsonResponse({'error': 'Forbidden'}, status=403)
 
-    history, error = Database.get_payroll_history(user_id)
+    query, error = _payroll_query(request)
     if error:
-        return JsonResponse({'error': error}, status=404)
+        return JsonResponse({'error': error}, status=400)
 
-    return JsonResponse({'payroll_history': history})
+    return _payroll_page_response(user_id, query)
 
 # API: Generate payroll PDF (user or admin)
 @require_http_methods(["GET"])
@@ -233,51 +495,7 @@ def api_payroll_pdf(request, user_id):
     if not record:
         return JsonResponse({'error': 'Payroll record not found'}, status=404)
 
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4, title='Slip Gaji')
-    styles = getSampleStyleSheet()
-
-    elements = []
-    elements.append(Paragraph('Slip Gaji (Payroll Slip)', styles['Title']))
-    elements.append(Spacer(1, 12))
-    elements.append(Paragraph(f"Nama: {user.get('full_name', user.get('username'))}", styles['Normal']))
-    elements.append(Paragraph(f"ID: #{user.get('id')}", styles['Normal']))
-    elements.append(Paragraph(f"Department: {user.get('department', '-')}", styles['Normal']))
-    elements.append(Paragraph(f"Position: {user.get('position', '-')}", styles['Normal']))
-    elements.append(Paragraph(f"Periode: {month}", styles['Normal']))
-    elements.append(Spacer(1, 12))
-
-    table_data = [
-        ['Komponen', 'Jumlah'],
-        ['Gaji Pokok', f"Rp {record.get('base_salary', 0):,.2f}"],
-        ['Tunjangan', f"Rp {record.get('allowances', 0):,.2f}"],
-        ['Potongan', f"Rp {record.get('deductions', 0):,.2f}"],
-        ['Total Diterima', f"Rp {record.get('net_salary', 0):,.2f}"]
-    ]
-
-    table = Table(table_data, colWidths=[250, 200])
-    table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#f2f2f2')),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.black),
-        ('ALIGN', (1, 1), (-1, -1), 'RIGHT'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, -1), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
-        ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#dddddd')),
-    ]))
-    elements.append(table)
-
-    notes = record.get('notes')
-    if notes:
-        elements.append(Spacer(1, 10))
-        elements.append(Paragraph(f"Catatan: {notes}", styles['Normal']))
-
-    elements.append(Spacer(1, 24))
-    elements.append(Paragraph('Dokumen ini dihasilkan oleh sistem.', styles['Italic']))
-
-    doc.build(elements)
-    pdf = buffer.getvalue()
-    buffer.close()
+    pdf = build_payslip_pdf(user, record, month)
 
     filename = f"slip-gaji-{user.get('username')}-{month}.pdf"
     response = HttpResponse(pdf, content_type='application/pdf')
@@ -294,8 +512,40 @@ def api_users(request):
     if not user or user['role'] != 'admin':
         return JsonResponse({'error': 'Forbidden'}, status=403)
     
+    query, error = _users_page_query(request)
+    if error:
+        return JsonResponse({'error': error}, status=400)
+    if query:
+        return JsonResponse(_get_users_page(**query))
+
+    # Read the version first: replaying a change the list already has is harmless
+    last_seq = Database.get_change_seq()
     users = Database.get_all_users()
-    return JsonResponse({'users': [_sanitize_user(u) for u in users]})
+    return JsonResponse({'users': [_sanitize_user(u) for u in users], 'last_seq': last_seq})
+
+# API: Change feed (Admin only)
+@require_http_methods(["GET"])
+def api_changes(request):
+    if 'user_id' not in request.session:
+        return JsonResponse({'error': 'Unauthorized'}, status=401)
+
+    user = Database.get_user_by_id(request.session['user_id'])
+    if not user or user['role'] != 'admin':
+        return JsonResponse({'error': 'Forbidden'}, status=403)
+
+    params, error = _change_feed_params(request)
+    if error:
+        return JsonResponse({'error': error}, status=400)
+
+    # A held connection would tie up a whole WSGI worker; the ASGI variant streams and waits
+    if params['stream']:
+        return JsonResponse({'error': 'Streaming needs the ASGI server; poll with since= instead'}, status=400)
+
+    since = params['since']
+    if since is None:
+        since = Database.get_change_seq()
+    changes, last_seq, reset = Database.get_changes(since)
+    return JsonResponse({'changes': changes, 'last_seq': last_seq, 'reset': reset})
 
 # API: Create user
 @require_http_methods(["POST"])
@@ -463,39 +713,11 @@ def upload_profile_picture(request, user_id):
             return JsonResponse({'error': 'No file provided'}, status=400)
         
         file = request.FILES['profile_picture']
+        error = _profile_picture_error(file)
+        if error:
+            return JsonResponse({'error': error}, status=400)
         
-        # Validate file type
-        valid_types = ['image/jpeg', 'image/png', 'image/gif', 'image/webp']
-        if file.content_type not in valid_types:
-            return JsonResponse({'error': 'Invalid file type. Only JPEG, PNG, GIF, and WebP allowed.'}, status=400)
-        
-        # Validate file size (max 5MB)
-        if file.size > 5 * 1024 * 1024:
-            return JsonResponse({'error': 'File too large. Max 5MB allowed.'}, status=400)
-        
-        # Generate unique filename
-        ext = mimetypes.guess_extension(file.content_type) or '.jpg'
-        filename = f"user_{user_id}_{secrets.token_hex(8)}{ext}"
-        
-        # Save file
-        upload_dir = os.path.join(settings.BASE_DIR, 'manage', 'static', 'img', 'uploads')
-        os.makedirs(upload_dir, exist_ok=True)
-        filepath = os.path.join(upload_dir, filename)
-        
-        with open(filepath, 'wb') as f:
-            for chunk in file.chunks():
-                f.write(chunk)
-        
-        # Delete old picture if exists
-        target_user = Database.get_user_by_id(user_id)
-        if target_user and target_user.get('profile_picture'):
-            old_pic = os.path.join(upload_dir, os.path.basename(target_user['profile_picture']))
-            if os.path.exists(old_pic):
-                os.remove(old_pic)
-        
-        # Update database
-        pic_url = f"/static/img/uploads/{filename}"
-        Database.update_user(user_id, profile_picture=pic_url)
+        pic_url = _save_profile_picture(user_id, file)
         
         return JsonResponse({'success': True, 'profile_picture': pic_url})
     except Exception as e: